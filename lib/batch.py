@@ -0,0 +1,43 @@
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple
+
+from . import pattern, steps
+from .wallspec import WallSpec, WallSpecError, as_spec
+
+
+class BatchJob(NamedTuple):
+    config: WallSpec | dict
+    # seed of the wild bond pattern, None for a random one
+    seed: int | None = None
+
+
+class BatchResult(NamedTuple):
+    pattern: list[list[str]] | None
+    instructions: list[steps.Stride] | None
+    # the reason of the failure, None if the pattern and the steps are generated
+    error: str | None
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    """
+    Generates the pattern and the steps for one wallconfig
+    Everything the generation needs is created for the call, so jobs can run in parallel threads
+    """
+    try:
+        spec = as_spec(job.config)
+        ptrn = pattern.get_pattern(spec, random.Random(job.seed))
+    except (WallSpecError, pattern.PatternError) as e:
+        return BatchResult(None, None, str(e))
+    return BatchResult(ptrn, steps.get_instructions(spec, ptrn), None)
+
+
+def run_batch(jobs: Iterable[BatchJob], max_workers: int | None = None):
+    """
+    Runs the jobs in a thread pool and yields their results in the order of the jobs
+    The generation is pure Python, so the threads only run in parallel on a free-threaded
+    CPython build. With the GIL use the sweep mode, it runs the wallconfigs in processes
+    """
+    with ThreadPoolExecutor(max_workers) as executor:
+        yield from executor.map(run_job, jobs)
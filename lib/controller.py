@@ -0,0 +1,218 @@
+"""
+Streaming the plan to a robot controller
+
+The protocol is line based. The sender sends the commands of print_instructions numbered
+with a sequence number that grows over the whole plan:
+
+    0 move 0 0
+    1 lay 0 0
+    2 lay 1 0
+
+The controller answers "ack <seq>" when it has executed the command. At most `window`
+commands are sent without an acknowledgement. After a reconnect the sender continues
+from the first command that isn't acknowledged. If it is a lay command, the move command
+of its stride is sent again first, so the controller knows where the envelope is.
+"""
+
+import asyncio
+import threading
+
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple
+
+from .steps import Stride
+from .wallspec import WallSpec, as_spec
+
+
+class ControllerError(RuntimeError):
+    pass
+
+
+class Command(NamedTuple):
+    seq: int
+    # the sequence number of the move command of the stride the command belongs to
+    move_seq: int
+    text: str
+
+
+@dataclass
+class StreamState:
+    commands: list[Command] = field(default_factory=list)
+    n_acked: int = 0
+    planning_done: bool = False
+    planning_error: Exception | None = None
+    # notified whenever commands are added or acknowledged
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    def is_done(self) -> bool:
+        return self.planning_done and self.n_acked == len(self.commands)
+
+
+def stride_commands(stride: Stride, first_seq: int, spec: WallSpec) -> list[Command]:
+    x = spec.to_mm(stride.envelope_pos.x)
+    y = spec.to_mm(stride.envelope_pos.y)
+    commands = [Command(first_seq, first_seq, f"move {x} {y}")]
+    for brick in stride.steps:
+        commands.append(
+            Command(first_seq + len(commands), first_seq, f"lay {brick.x} {brick.y}")
+        )
+    return commands
+
+
+def parse_address(address: str) -> tuple[str, str, int | None]:
+    """
+    Parses "tcp://host:port" or "unix:/path/to/socket" into ("tcp", host, port)
+    or ("unix", path, None), raises ValueError for anything else
+    """
+    if address.startswith("unix:") and len(address) > len("unix:"):
+        return "unix", address[len("unix:") :], None
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://") :].rpartition(":")
+        if host and port.isdigit():
+            return "tcp", host, int(port)
+    raise ValueError(
+        f"controller address {address} should be tcp://host:port or unix:/path"
+    )
+
+
+async def open_connection(address: str):
+    scheme, host_or_path, port = parse_address(address)
+    if scheme == "unix":
+        return await asyncio.open_unix_connection(host_or_path)
+    return await asyncio.open_connection(host_or_path, port)
+
+
+async def notify(state: StreamState):
+    async with state.changed:
+        state.changed.notify_all()
+
+
+async def read_acks(reader: asyncio.StreamReader, state: StreamState):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionResetError("controller closed the connection")
+            words = line.decode().split()
+            if len(words) != 2 or words[0] != "ack" or not words[1].isdigit():
+                raise ControllerError(f"unexpected message from controller: {line!r}")
+            # the controller executes the commands in order, so an ack covers all the previous commands
+            state.n_acked = max(state.n_acked, int(words[1]) + 1)
+            await notify(state)
+    finally:
+        await notify(state)
+
+
+async def run_session(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    state: StreamState,
+    window: int,
+):
+    acks = asyncio.create_task(read_acks(reader, state))
+    next_seq = state.n_acked
+    try:
+        if next_seq < len(state.commands):
+            command = state.commands[next_seq]
+            if command.move_seq != command.seq:
+                move = state.commands[command.move_seq]
+                writer.write(f"{move.seq} {move.text}\n".encode())
+
+        def can_send():
+            return next_seq < len(state.commands) and next_seq - state.n_acked < window
+
+        while True:
+            async with state.changed:
+                await state.changed.wait_for(
+                    lambda: acks.done() or state.is_done() or can_send()
+                )
+            if state.is_done():
+                return
+            if acks.done():
+                # read_acks only stops with an exception
+                acks.result()
+            while can_send():
+                command = state.commands[next_seq]
+                writer.write(f"{command.seq} {command.text}\n".encode())
+                next_seq += 1
+            await writer.drain()
+    finally:
+        acks.cancel()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, asyncio.CancelledError):
+            pass
+
+
+def plan_in_thread(
+    strides: Iterable[Stride],
+    spec: WallSpec,
+    state: StreamState,
+    loop: asyncio.AbstractEventLoop,
+):
+    """
+    Consumes the strides (e. g. steps.iter_instructions, which plans them on the fly)
+    in a thread and hands every stride over to the event loop as soon as it is ready
+    """
+
+    def add_commands(commands: list[Command]):
+        state.commands.extend(commands)
+        asyncio.ensure_future(notify(state))
+
+    def finish(error: Exception | None):
+        state.planning_done = True
+        state.planning_error = error
+        asyncio.ensure_future(notify(state))
+
+    def run():
+        n_commands = 0
+        error = None
+        try:
+            for stride in strides:
+                commands = stride_commands(stride, n_commands, spec)
+                n_commands += len(commands)
+                loop.call_soon_threadsafe(add_commands, commands)
+        except Exception as e:
+            error = e
+        finally:
+            loop.call_soon_threadsafe(finish, error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+async def send_plan(
+    address: str,
+    strides: Iterable[Stride],
+    config: WallSpec | dict,
+    window: int = 16,
+    retry_delay: float = 1.0,
+    max_retries: int = 10,
+) -> int:
+    """
+    Streams the strides to the controller while they are planned and returns the number of
+    acknowledged commands. Reconnects after connection errors, giving up after max_retries
+    attempts in a row without any acknowledged command
+    If the planning fails, the error is raised after the planned strides are sent
+    """
+    spec = as_spec(config)
+    state = StreamState()
+    plan_in_thread(strides, spec, state, asyncio.get_running_loop())
+    n_failures = 0
+    while not state.is_done():
+        n_acked_before = state.n_acked
+        try:
+            reader, writer = await open_connection(address)
+            await run_session(reader, writer, state, window)
+        except (OSError, asyncio.IncompleteReadError):
+            if state.n_acked > n_acked_before:
+                n_failures = 0
+            n_failures += 1
+            if n_failures > max_retries:
+                raise
+            await asyncio.sleep(retry_delay)
+    if state.planning_error is not None:
+        raise state.planning_error
+    return state.n_acked
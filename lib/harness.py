@@ -0,0 +1,434 @@
+import random
+import time
+
+from . import pattern, schedule, simulate, steps, validate
+from .wallspec import WallSpec, compile_config
+
+
+# Optimized pattern generators checked against pattern.get_pattern with the same random seed:
+# name -> (generator, whether the pattern must be identical or only follow the rules of the bond,
+# the bonds the generator supports or None for all of them)
+# get_pattern keeps all the wild bond courses for going back, the streaming generator
+# only the last few, so it must go back the same way to give the same wall
+PATTERN_GENERATORS = {
+    "streaming wild bond courses": (
+        lambda spec, rng: list(
+            pattern.iter_wild_bond_courses(
+                spec, window=pattern.WILD_BOND_STREAMING_WINDOW, rng=rng
+            )
+        ),
+        True,
+        ("wild",),
+    ),
+}
+
+
+# Optimized planners checked against the plain steps.get_instructions:
+# name -> (planner, whether the plan must be identical or only valid)
+PLANNERS = {
+    "memoized steps": (
+        lambda spec, ptrn: steps.get_instructions(
+            spec, ptrn, memoize=True, prune=False
+        ),
+        True,
+    ),
+    "pruned steps": (
+        lambda spec, ptrn: steps.get_instructions(
+            spec, ptrn, memoize=False, prune=True
+        ),
+        True,
+    ),
+    "pruned steps with 6 candidate courses": (
+        lambda spec, ptrn: steps.get_instructions(spec, ptrn, candidate_courses=6),
+        False,
+    ),
+}
+
+
+# The machine profile of default.machineconfig for the schedule check
+SCHEDULE_PROFILE = simulate.MachineProfile(
+    lay_times={"f": 12, "h": 10, "d": 11, "q": 8},
+    move_speed_x=100,
+    move_speed_y=50,
+    setup_time=30,
+    arm_speed=250,
+)
+# The schedule check tries 1 to SCHEDULE_MAX_MACHINES machines
+SCHEDULE_MAX_MACHINES = 4
+
+
+def get_reference_instructions(
+    spec: WallSpec, ptrn: list[list[str]]
+) -> list[steps.Stride]:
+    return steps.get_instructions(spec, ptrn, memoize=False, prune=False)
+
+
+def random_wallconfig(rng: random.Random) -> dict:
+    """
+    Returns a random wallconfig that the generator of its bond accepts
+    The bricks keep the proportions the bonds rely on: a full brick is two half bricks
+    and a joint, a half brick is two quater bricks and a joint, a drieklezoor is
+    a full brick without a quater brick and a joint
+    """
+    bond = rng.choice(["stretcher", "english cross", "flemish", "wild"])
+    head = rng.choice([5, 7.5, 10, 12.5])
+    half = rng.randint(80, 120)
+    full = 2 * half + head
+    quater = (half - head) / 2
+    drieklezoor = full - quater - head
+    height = rng.randint(45, 75)
+    bed = rng.choice([10, 12.5, 15])
+    config = {
+        "bond": bond,
+        "envelope": {
+            "width": rng.randint(2 * full, 4 * full),
+            "height": (height + bed) * rng.randint(3, 12),
+        },
+        "wall": {"height": (height + bed) * rng.randint(4, 16)},
+        "joints": {"head": head, "bed": bed},
+        "bricks": {
+            "f": {"name": "full brick", "length": full, "height": height},
+            "h": {"name": "half brick", "length": half, "height": height},
+            "d": {"name": "drieklezoor", "length": drieklezoor, "height": height},
+            "q": {"name": "quater brick", "length": quater, "height": height},
+        },
+    }
+    # All the bonds are made of quater brick steps, so I look for a valid width among them
+    step = (half + head) / 2
+    widths = [full + n * step for n in range(8, 50)]
+    rng.shuffle(widths)
+    for width in widths:
+        config["wall"]["width"] = width
+        if is_valid_width(config):
+            break
+    else:
+        raise ValueError(f"no valid wall width for {bond} bond")
+    return config
+
+
+def is_valid_width(config: dict) -> bool:
+    spec = compile_config(config)
+    if spec.bond == "wild":
+        # the full and half bricks with their joints are multiples of a half brick with a joint,
+        # so a course fits iff the rest after the drieklezoor brick is such a multiple
+        step = spec.length("h") + spec.head_joint
+        return (spec.wall_width - spec.length("d")) % step == 0
+    try:
+        pattern.get_pattern(spec)
+    except pattern.PatternError:
+        return False
+    return True
+
+
+def check_pattern(spec: WallSpec, ptrn: list[list[str]]) -> str | None:
+    """
+    Returns the description of the first broken rule of the pattern or None if the pattern is fine
+    """
+    if len(ptrn) * spec.course_height != spec.wall_height:
+        return f"{len(ptrn)} courses don't make the wall height"
+    for y, course in enumerate(ptrn):
+        for brick_type in course:
+            if brick_type not in spec.type_codes:
+                return f"unknown brick type {brick_type} in course {y}"
+        width = sum(spec.length(t) for t in course) + spec.head_joint * (
+            len(course) - 1
+        )
+        if width != spec.wall_width:
+            return f"course {y} has width {spec.to_mm(width)} instead of the wall width"
+    if spec.bond == "wild":
+        return check_wild_bond(spec, ptrn)
+    return None
+
+
+def check_wild_bond(spec: WallSpec, ptrn: list[list[str]]) -> str | None:
+    """
+    Checks the wild bond rules from the README
+    The bricks finishing the courses at the wall edges (the drieklezoor bricks and the bricks
+    next to them at the end of the course) are filled in by the generator without the checks,
+    so they are exempt and start new staggered steps, as in the generator
+    """
+    q_len = spec.length("q")
+    h_joint = spec.head_joint
+    beneath: list[tuple[str, int, int, int, int]] = []
+    for y, course in enumerate(ptrn):
+        if y % 2 == 0 and course[-1] != "d":
+            return f"even course {y} doesn't end with a drieklezoor brick"
+        if y % 2 == 1 and course[0] != "d":
+            return f"odd course {y} doesn't start with a drieklezoor brick"
+        if any(t == "d" for t in course[1:-1]):
+            return f"course {y} has a drieklezoor brick in the middle"
+        if y % 2 == 0:
+            checked = range(0, len(course) - 2)
+        else:
+            checked = range(1, len(course) - 1)
+        # (type, left, right, left staggered steps, right staggered steps) of every brick
+        current = []
+        x = 0
+        for i, brick_type in enumerate(course):
+            left, right = x, x + spec.length(brick_type)
+            x = right + h_joint
+            n_left, n_right = 1, 1
+            if i in checked:
+                if brick_type == "h" and i > 0 and course[i - 1] == "h":
+                    return (
+                        f"half bricks {i - 1} and {i} of course {y} "
+                        "are next to each other"
+                    )
+                for (
+                    other_type,
+                    other_left,
+                    other_right,
+                    other_n_left,
+                    other_n_right,
+                ) in beneath:
+                    if other_right == right - h_joint - q_len:
+                        n_left = other_n_left + 1
+                    if other_right == right + h_joint + q_len:
+                        n_right = other_n_right + 1
+                    if (
+                        brick_type == "h"
+                        and other_type == "h"
+                        and other_left <= right
+                        and other_right >= left
+                    ):
+                        return f"half brick {i} of course {y} is on top of a half brick"
+                if n_left > 5 or n_right > 5:
+                    return f"brick {i} of course {y} makes more than 5 staggered steps"
+            current.append((brick_type, left, right, n_left, n_right))
+        beneath = current
+    return None
+
+
+def check_plan(
+    spec: WallSpec, ptrn: list[list[str]], instructions: list[steps.Stride]
+) -> str | None:
+    """
+    Returns the description of the first invalid step of the plan or None if the plan is valid
+    """
+    violation = validate.validate_plan(instructions, spec, ptrn)
+    return None if violation is None else validate.describe(violation)
+
+
+def check_schedule(
+    spec: WallSpec,
+    ptrn: list[list[str]],
+    instructions: list[steps.Stride],
+    sched: schedule.Schedule,
+    profile: simulate.MachineProfile,
+) -> str | None:
+    """
+    Replays the schedule independently of schedule.schedule_strides and returns the description
+    of the first broken rule or None if the schedule is fine: every stride is done once,
+    after the strides beneath it, and no two machines ever occupy the same part of the wall
+    """
+    start_times: dict[int, float] = {}
+    finish_times: dict[int, float] = {}
+    # (start, end, left, right) of the part of the wall every machine occupies
+    occupied: list[list[tuple[float, float, int, int]]] = []
+    for timeline in sched.timelines:
+        machine_occupied = []
+        position = None
+        for i, scheduled in enumerate(timeline):
+            if scheduled.stride_n is not None:
+                if scheduled.stride_n in start_times:
+                    return f"stride {scheduled.stride_n + 1} is done twice"
+                start_times[scheduled.stride_n] = scheduled.start
+                finish_times[scheduled.stride_n] = scheduled.end
+            to = scheduled.envelope_pos
+            from_x = to.x if position is None else position.x
+            arrival = scheduled.start
+            if position is not None:
+                arrival += simulate.get_move_time(profile, position, to, spec)
+            leaving = timeline[i + 1].start if i + 1 < len(timeline) else float("inf")
+            machine_occupied.append(
+                (
+                    scheduled.start,
+                    arrival,
+                    min(from_x, to.x),
+                    max(from_x, to.x) + spec.envelope_width,
+                )
+            )
+            machine_occupied.append(
+                (arrival, leaving, to.x, to.x + spec.envelope_width)
+            )
+            position = to
+        occupied.append(machine_occupied)
+    if sorted(start_times) != list(range(len(instructions))):
+        return "not every stride is scheduled"
+    dependencies = schedule.get_stride_dependencies(instructions, spec, ptrn)
+    for stride_n, stride_dependencies in enumerate(dependencies):
+        for dependency in stride_dependencies:
+            if finish_times[dependency] > start_times[stride_n]:
+                return (
+                    f"stride {stride_n + 1} starts before stride {dependency + 1} ends"
+                )
+    for machine, machine_occupied in enumerate(occupied):
+        for other in range(machine + 1, len(occupied)):
+            for start, end, left, right in machine_occupied:
+                for other_start, other_end, other_left, other_right in occupied[other]:
+                    if (
+                        start < end
+                        and other_start < other_end
+                        and start < other_end
+                        and other_start < end
+                        and left < other_right
+                        and other_left < right
+                    ):
+                        return (
+                            f"machines {machine + 1} and {other + 1} meet "
+                            f"at {max(start, other_start):.1f}"
+                        )
+    return None
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def make_record(
+    case: int, name: str, error: str | None, reference_time, optimized_time
+):
+    return {
+        "case": case,
+        "check": name,
+        "ok": error is None,
+        "error": error,
+        "reference_time": reference_time,
+        "optimized_time": optimized_time,
+        "speedup": reference_time / optimized_time if optimized_time else None,
+    }
+
+
+def edit_pattern(rng: random.Random, ptrn: list[list[str]]) -> list[list[str]]:
+    # swapping two neighbouring bricks of different types in one of the upper courses
+    edited = [list(course) for course in ptrn]
+    for y in rng.sample(range(len(ptrn) // 2, len(ptrn)), len(ptrn) - len(ptrn) // 2):
+        course = edited[y]
+        swaps = [i for i in range(1, len(course)) if course[i - 1] != course[i]]
+        if swaps:
+            i = rng.choice(swaps)
+            course[i - 1], course[i] = course[i], course[i - 1]
+            break
+    return edited
+
+
+def run_case(case: int, seed: int):
+    """
+    Runs all the checks for one random wallconfig and yields one record per check
+    """
+    rng = random.Random(seed)
+    config = random_wallconfig(rng)
+    spec = compile_config(config)
+    info = {"seed": seed, "bond": spec.bond, "config": config}
+
+    reference_time = None
+    try:
+        reference_pattern, reference_time = timed(
+            pattern.get_pattern, spec, random.Random(seed)
+        )
+        error = check_pattern(spec, reference_pattern)
+    except pattern.PatternError as e:
+        error = f"can't generate the pattern: {e}"
+    yield info | make_record(case, "pattern", error, reference_time, None)
+    if error:
+        return
+
+    for name, (generator, identical, bonds) in PATTERN_GENERATORS.items():
+        if bonds is not None and spec.bond not in bonds:
+            continue
+        optimized_time = None
+        try:
+            generated, optimized_time = timed(generator, spec, random.Random(seed))
+            if identical and generated != reference_pattern:
+                error = "the pattern differs from the reference"
+            else:
+                error = check_pattern(spec, generated)
+        except pattern.PatternError as e:
+            error = f"can't generate the pattern: {e}"
+        yield info | make_record(case, name, error, reference_time, optimized_time)
+
+    reference_plan, reference_time = timed(
+        get_reference_instructions, spec, reference_pattern
+    )
+    error = check_plan(spec, reference_pattern, reference_plan)
+    yield info | make_record(case, "steps", error, reference_time, None)
+    if error:
+        return
+
+    for name, (planner, identical) in PLANNERS.items():
+        plan, optimized_time = timed(planner, spec, reference_pattern)
+        if identical and plan != reference_plan:
+            error = "the plan differs from the reference"
+        else:
+            error = check_plan(spec, reference_pattern, plan)
+        yield info | make_record(case, name, error, reference_time, optimized_time)
+
+    # Replanning an unchanged pattern must reuse the whole plan
+    plan, optimized_time = timed(
+        steps.replan_instructions,
+        spec,
+        reference_pattern,
+        reference_plan,
+        reference_pattern,
+    )
+    error = None if plan == reference_plan else "the plan differs from the reference"
+    yield info | make_record(
+        case, "replan unchanged", error, reference_time, optimized_time
+    )
+
+    # Every schedule must be feasible and more machines must never make it slower
+    error = None
+    makespan = None
+    reference_time = optimized_time = None
+    for n_machines in range(1, SCHEDULE_MAX_MACHINES + 1):
+        sched, schedule_time = timed(
+            schedule.schedule_strides,
+            reference_plan,
+            spec,
+            reference_pattern,
+            n_machines,
+            SCHEDULE_PROFILE,
+        )
+        if n_machines == 1:
+            reference_time = schedule_time
+        else:
+            optimized_time = schedule_time
+        error = check_schedule(
+            spec, reference_pattern, reference_plan, sched, SCHEDULE_PROFILE
+        )
+        if error is None and makespan is not None and sched.makespan > makespan:
+            error = (
+                f"makespan {sched.makespan:.1f} of {n_machines} machines "
+                f"is more than {makespan:.1f} of {n_machines - 1}"
+            )
+        if error is not None:
+            error = f"{n_machines} machines: {error}"
+            break
+        makespan = sched.makespan
+    yield info | make_record(case, "schedule", error, reference_time, optimized_time)
+
+    edited_pattern = edit_pattern(rng, reference_pattern)
+    edited_plan, reference_time = timed(steps.get_instructions, spec, edited_pattern)
+    plan, optimized_time = timed(
+        steps.replan_instructions,
+        spec,
+        reference_pattern,
+        reference_plan,
+        edited_pattern,
+    )
+    error = check_plan(spec, edited_pattern, plan)
+    yield info | make_record(
+        case, "replan edited", error, reference_time, optimized_time
+    )
+
+
+def run_harness(n_cases: int, seed: int):
+    """
+    Yields the records of all the checks of n_cases random wallconfigs
+    The seed of every case is in its records, so a failed case can be reproduced with run_case
+    """
+    seeds = random.Random(seed)
+    for case in range(n_cases):
+        yield from run_case(case, seeds.randrange(2**32))
@@ -0,0 +1,170 @@
+from typing import NamedTuple
+
+from .simulate import (
+    MachineProfile,
+    MachineProfileError,
+    get_arm_path_length,
+    get_brick_centers,
+)
+from .steps import PositionInPattern, Stride, get_bricks_beneath
+from .wallspec import WallSpec, as_spec
+
+
+class OrderingSaving(NamedTuple):
+    # estimated arm travel time of the stride in seconds
+    time_before: float
+    time_after: float
+
+
+def get_predecessors(
+    stride: Stride, config: WallSpec | dict, pattern: list[list[str]]
+) -> dict[PositionInPattern, set[PositionInPattern]]:
+    """
+    Returns for every brick of the stride the bricks of the same stride right beneath it,
+    they have to be layed first. The bricks beneath layed in the previous strides are already there
+    """
+    spec = as_spec(config)
+    in_stride = set(stride.steps)
+    return {
+        brick: get_bricks_beneath(brick, spec, pattern) & in_stride
+        for brick in stride.steps
+    }
+
+
+def is_valid_order(
+    order: list[PositionInPattern],
+    predecessors: dict[PositionInPattern, set[PositionInPattern]],
+) -> bool:
+    layed = set()
+    for brick in order:
+        if not predecessors[brick] <= layed:
+            return False
+        layed.add(brick)
+    return True
+
+
+def nearest_neighbour_order(
+    stride: Stride,
+    predecessors: dict[PositionInPattern, set[PositionInPattern]],
+    centers: list[list[tuple[float, float]]],
+) -> list[PositionInPattern]:
+    """
+    Starting at the envelope position, lays the nearest brick whose bricks beneath are layed
+    The ties go to the brick that comes first in the original order, so the result is deterministic
+    """
+    remaining = list(stride.steps)
+    layed = set()
+    order = []
+    position = stride.envelope_pos
+    while remaining:
+        next_brick = min(
+            (brick for brick in remaining if predecessors[brick] <= layed),
+            key=lambda brick: get_arm_path_length(position, [brick], centers),
+        )
+        remaining.remove(next_brick)
+        layed.add(next_brick)
+        order.append(next_brick)
+        position = centers[next_brick.y][next_brick.x]
+    return order
+
+
+def two_opt(
+    stride: Stride,
+    order: list[PositionInPattern],
+    predecessors: dict[PositionInPattern, set[PositionInPattern]],
+    centers: list[list[tuple[float, float]]],
+) -> list[PositionInPattern]:
+    """
+    Reverses the parts of the order while it makes the arm path shorter
+    and keeps every brick after the bricks beneath it
+    """
+    order = list(order)
+    length = get_arm_path_length(stride.envelope_pos, order, centers)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i : j + 1][::-1] + order[j + 1 :]
+                if not is_valid_order(candidate, predecessors):
+                    continue
+                candidate_length = get_arm_path_length(
+                    stride.envelope_pos, candidate, centers
+                )
+                # the small margin keeps the float rounding from reversing the same part back and forth
+                if candidate_length < length - 1e-9:
+                    order, length = candidate, candidate_length
+                    improved = True
+    return order
+
+
+def order_stride(
+    stride: Stride,
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    centers: list[list[tuple[float, float]]],
+) -> Stride:
+    """
+    Returns the stride with the bricks in the order of the shortest arm path found
+    The nearest neighbour order and the original order are both improved with 2-opt
+    and the shortest of them is taken, so the path is never longer than the original one
+    """
+    predecessors = get_predecessors(stride, config, pattern)
+    best_order = stride.steps
+    best_length = get_arm_path_length(stride.envelope_pos, best_order, centers)
+    for start_order in [
+        nearest_neighbour_order(stride, predecessors, centers),
+        stride.steps,
+    ]:
+        order = two_opt(stride, start_order, predecessors, centers)
+        length = get_arm_path_length(stride.envelope_pos, order, centers)
+        if length < best_length - 1e-9:
+            best_order, best_length = order, length
+    return Stride(stride.envelope_pos, list(best_order))
+
+
+def order_instructions(
+    instructions: list[Stride],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    profile: MachineProfile,
+) -> tuple[list[Stride], list[OrderingSaving]]:
+    """
+    Post-pass over a plan: reorders the bricks of every stride to shorten the arm travel
+    The envelope positions and the bricks of the strides stay the same
+    Returns the reordered plan and the arm travel time of every stride before and after
+    """
+    spec = as_spec(config)
+    if profile.arm_speed is None:
+        raise MachineProfileError(
+            "machineconfig has no [arm] section with the arm speed"
+        )
+    centers = get_brick_centers(spec, pattern)
+    # the path lengths are in units, the speed in mm per second
+    arm_speed = profile.arm_speed * spec.units_per_mm
+    ordered = []
+    savings = []
+    for stride in instructions:
+        ordered_stride = order_stride(stride, spec, pattern, centers)
+        ordered.append(ordered_stride)
+        savings.append(
+            OrderingSaving(
+                get_arm_path_length(stride.envelope_pos, stride.steps, centers)
+                / arm_speed,
+                get_arm_path_length(stride.envelope_pos, ordered_stride.steps, centers)
+                / arm_speed,
+            )
+        )
+    return ordered, savings
+
+
+def print_savings(savings: list[OrderingSaving], file=None):
+    for stride_n, saving in enumerate(savings):
+        print(
+            f"stride {stride_n + 1} arm {saving.time_before:.1f} -> "
+            f"{saving.time_after:.1f} saved {saving.time_before - saving.time_after:.1f}",
+            file=file,
+        )
+    before = sum(saving.time_before for saving in savings)
+    after = sum(saving.time_after for saving in savings)
+    print(f"wall arm {before:.1f} -> {after:.1f} saved {before - after:.1f}", file=file)
@@ -1,10 +1,19 @@
+import bisect
 import random
-import sys
 
 from dataclasses import dataclass
 
+from .wallspec import WallSpec, as_spec
 
-EPS = 1e-8
+
+# How many finished courses the streaming wild bond generator keeps to go back to
+WILD_BOND_STREAMING_WINDOW = 4
+
+
+class PatternError(ValueError):
+    """
+    The pattern of the bond can't be generated for the wallconfig, the message says why
+    """
 
 
 @dataclass
@@ -14,88 +23,71 @@ class BrickWithFallenTeethData:
     n_right_teeth: int
 
 
-def eq(a: float, b: float) -> bool:
-    return abs(a - b) < EPS
-
-
 def get_total_n_bricks(ptrn: list[list[str]]):
     return sum(map(len, ptrn))
 
 
 def get_stretcher_bond_even_course(
-    wall_width, full_brick_length, half_brick_length, head_joint
+    wall_width, full_brick_length, half_brick_length, head_joint, spec
 ):
     if wall_width < full_brick_length:
-        print(
-            f"Error: can't generate stretcher bond even course because wall width {wall_width} is smaller than full brick length {full_brick_length}",
-            file=sys.stderr,
+        raise PatternError(
+            f"can't generate stretcher bond even course because wall width {spec.to_mm(wall_width)} is smaller than full brick length {spec.to_mm(full_brick_length)}"
         )
-        return None
     pattern = ["f"]
     l = wall_width - full_brick_length
-    n = int(l / (full_brick_length + head_joint))
+    n = l // (full_brick_length + head_joint)
     pattern.extend(["f" for _ in range(n)])
     r = l - n * (full_brick_length + head_joint)
-    if not eq(r, 0):
-        if not eq(r, head_joint + half_brick_length):
-            print(
-                f"Error: can't finish remaining {r} width of stretcher bond with a halfbrick of length {half_brick_length} and a joint of size {head_joint}",
-                file=sys.stderr,
+    if r != 0:
+        if r != head_joint + half_brick_length:
+            raise PatternError(
+                f"can't finish remaining {spec.to_mm(r)} width of stretcher bond with a halfbrick of length {spec.to_mm(half_brick_length)} and a joint of size {spec.to_mm(head_joint)}"
             )
-            return None
         pattern.append("h")
     return pattern
 
 
 def get_stretcher_bond_odd_course(
-    wall_width, full_brick_length, half_brick_length, head_joint
+    wall_width, full_brick_length, half_brick_length, head_joint, spec
 ):
     if wall_width < half_brick_length:
-        print(
-            f"Error: can't generate odd course because wall width {wall_width} is smaller than half brick length {half_brick_length}",
-            file=sys.stderr,
+        raise PatternError(
+            f"can't generate odd course because wall width {spec.to_mm(wall_width)} is smaller than half brick length {spec.to_mm(half_brick_length)}"
         )
-        return None
     pattern = ["h"]
     l = wall_width - half_brick_length
-    n = int(l / (full_brick_length + head_joint))
+    n = l // (full_brick_length + head_joint)
     pattern.extend(["f" for i in range(n)])
     r = l - n * (full_brick_length + head_joint)
-    if not eq(r, 0):
-        if not eq(head_joint + half_brick_length, r):
-            print(
-                f"Error: can't finish remaining {r} width with a halfbrick of length {half_brick_length} and joint of size {head_joint}",
-                file=sys.stderr,
+    if r != 0:
+        if head_joint + half_brick_length != r:
+            raise PatternError(
+                f"can't finish remaining {spec.to_mm(r)} width with a halfbrick of length {spec.to_mm(half_brick_length)} and joint of size {spec.to_mm(head_joint)}"
             )
-            return None
         pattern.append("h")
     return pattern
 
 
-def get_stretcher_bond_pattern(config: dict):
-    wall_width = config["wall"]["width"]
-    wall_height = config["wall"]["height"]
-    head_joint = config["joints"]["head"]
-    bed_joint = config["joints"]["bed"]
-    brick_height = config["bricks"]["f"]["height"]
-    full_brick_length = config["bricks"]["f"]["length"]
-    half_brick_length = config["bricks"]["h"]["length"]
-    course_height = bed_joint + brick_height
-    n_courses = int(wall_height / course_height)
-    if not eq(wall_height, course_height * n_courses):
-        print(
-            f"Error: The wall height {wall_height} can't be represented as a whole number of courses of height {course_height}",
-            file=sys.stderr,
+def get_stretcher_bond_pattern(config: WallSpec | dict):
+    spec = as_spec(config)
+    wall_width = spec.wall_width
+    wall_height = spec.wall_height
+    head_joint = spec.head_joint
+    full_brick_length = spec.length("f")
+    half_brick_length = spec.length("h")
+    course_height = spec.course_height
+    n_courses = wall_height // course_height
+    if wall_height != course_height * n_courses:
+        raise PatternError(
+            f"The wall height {spec.to_mm(wall_height)} can't be represented as a whole number of courses of height {spec.to_mm(course_height)}"
         )
-        return None
     even_course = get_stretcher_bond_even_course(
-        wall_width, full_brick_length, half_brick_length, head_joint
+        wall_width, full_brick_length, half_brick_length, head_joint, spec
     )
     odd_course = get_stretcher_bond_odd_course(
-        wall_width, full_brick_length, half_brick_length, head_joint
+        wall_width, full_brick_length, half_brick_length, head_joint, spec
     )
-    if even_course is None or odd_course is None:
-        return None
     pattern = []
     for i in range(n_courses):
         if i % 2 == 0:
@@ -106,30 +98,36 @@ def get_stretcher_bond_pattern(config: dict):
 
 
 def get_english_cross_bond_even_course(
-    wall_width, full_brick_length, half_brick_length, quater_brick_length, head_joint
+    wall_width,
+    full_brick_length,
+    half_brick_length,
+    quater_brick_length,
+    head_joint,
+    spec,
 ):
     if wall_width < full_brick_length:
-        print(
-            f"Error: can't generate odd course for english cross bond because wall width {wall_width} is smaller than full brick length {full_brick_length}",
-            file=sys.stderr,
+        raise PatternError(
+            f"can't generate odd course for english cross bond because wall width {spec.to_mm(wall_width)} is smaller than full brick length {spec.to_mm(full_brick_length)}"
         )
-        return None
     pattern = ["f"]
     l = wall_width - full_brick_length
-    n = int(l / (full_brick_length + head_joint))
+    n = l // (full_brick_length + head_joint)
     pattern.extend(["f" for i in range(n)])
     r = l - n * (full_brick_length + head_joint)
-    if not eq(r, 0):
-        print(
-            f"Error: can't generate odd coursr for english cross bond because wall width {wall_width} doesn't whole number of full bricks of length {full_brick_length} with joints of {head_joint}",
-            file=sys.stderr,
+    if r != 0:
+        raise PatternError(
+            f"can't generate odd coursr for english cross bond because wall width {spec.to_mm(wall_width)} doesn't whole number of full bricks of length {spec.to_mm(full_brick_length)} with joints of {spec.to_mm(head_joint)}"
         )
-        return None
     return pattern
 
 
 def get_english_cross_bond_odd_course(
-    wall_width, full_brick_length, half_brick_length, quater_brick_length, head_joint
+    wall_width,
+    full_brick_length,
+    half_brick_length,
+    quater_brick_length,
+    head_joint,
+    spec,
 ):
     if (
         wall_width
@@ -139,50 +137,44 @@ def get_english_cross_bond_odd_course(
         + head_joint
         + quater_brick_length
     ):
-        print(
-            f"Error: can't generate odd course for english cross bond because wall width {wall_width} is smaller than length of 2 quater bricks, 3 joins and a half brick",
-            file=sys.stderr,
+        raise PatternError(
+            f"can't generate odd course for english cross bond because wall width {spec.to_mm(wall_width)} is smaller than length of 2 quater bricks, 3 joins and a half brick"
         )
-        return None
     pattern = ["q"]
     l = wall_width - quater_brick_length
-    n = int(l / (half_brick_length + head_joint))
+    n = l // (half_brick_length + head_joint)
     pattern.extend(["h" for i in range(n)])
     r = l - n * (half_brick_length + head_joint)
-    if not eq(r, 0):
-        if not eq(head_joint + quater_brick_length, r):
-            print(
-                f"Error: can't finish remaining {r} width of odd course of english cross bond with a quaterbrick of length {quater_brick_length} and joint of size {head_joint}",
-                file=sys.stderr,
+    if r != 0:
+        if head_joint + quater_brick_length != r:
+            raise PatternError(
+                f"can't finish remaining {spec.to_mm(r)} width of odd course of english cross bond with a quaterbrick of length {spec.to_mm(quater_brick_length)} and joint of size {spec.to_mm(head_joint)}"
             )
-            return None
         pattern.append("q")
     return pattern
 
 
-def get_english_cross_bond_pattern(config: dict):
-    wall_width = config["wall"]["width"]
-    wall_height = config["wall"]["height"]
-    head_joint = config["joints"]["head"]
-    bed_joint = config["joints"]["bed"]
-    brick_height = config["bricks"]["f"]["height"]
-    full_brick_length = config["bricks"]["f"]["length"]
-    half_brick_length = config["bricks"]["h"]["length"]
-    quater_brick_length = config["bricks"]["q"]["length"]
-    course_height = bed_joint + brick_height
-    n_courses = int(wall_height / course_height)
-    if not eq(wall_height, course_height * n_courses):
-        print(
-            f"Error: The wall height {wall_height} can't be represented as a whole number of courses of height {course_height}",
-            file=sys.stderr,
+def get_english_cross_bond_pattern(config: WallSpec | dict):
+    spec = as_spec(config)
+    wall_width = spec.wall_width
+    wall_height = spec.wall_height
+    head_joint = spec.head_joint
+    full_brick_length = spec.length("f")
+    half_brick_length = spec.length("h")
+    quater_brick_length = spec.length("q")
+    course_height = spec.course_height
+    n_courses = wall_height // course_height
+    if wall_height != course_height * n_courses:
+        raise PatternError(
+            f"The wall height {spec.to_mm(wall_height)} can't be represented as a whole number of courses of height {spec.to_mm(course_height)}"
         )
-        return None
     even_course = get_english_cross_bond_even_course(
         wall_width,
         full_brick_length,
         half_brick_length,
         quater_brick_length,
         head_joint,
+        spec,
     )
     odd_course = get_english_cross_bond_odd_course(
         wall_width,
@@ -190,9 +182,8 @@ def get_english_cross_bond_pattern(config: dict):
         half_brick_length,
         quater_brick_length,
         head_joint,
+        spec,
     )
-    if even_course is None or odd_course is None:
-        return None
     pattern = []
     for i in range(n_courses):
         if i % 2 == 0:
@@ -203,7 +194,12 @@ def get_english_cross_bond_pattern(config: dict):
 
 
 def get_flemish_bond_even_course(
-    wall_width, full_brick_length, half_brick_length, quater_brick_length, head_joint
+    wall_width,
+    full_brick_length,
+    half_brick_length,
+    quater_brick_length,
+    head_joint,
+    spec,
 ):
     if (
         wall_width
@@ -213,33 +209,33 @@ def get_flemish_bond_even_course(
         + half_brick_length
         + 3 * head_joint
     ):
-        print(
-            f"Error: can't generate odd course for Flemish bond because",
-            f"wall width {wall_width} is smaller than full brick length {full_brick_length} plus",
-            f"half brick lenght {half_brick_length} * 2 plus quater brick lenght {quater_brick_length} plus head joint {head_joint} * 3",
-            file=sys.stderr,
-            sep="\n",
+        raise PatternError(
+            f"can't generate odd course for Flemish bond because "
+            f"wall width {spec.to_mm(wall_width)} is smaller than full brick length {spec.to_mm(full_brick_length)} plus "
+            f"half brick lenght {spec.to_mm(half_brick_length)} * 2 plus quater brick lenght {spec.to_mm(quater_brick_length)} plus head joint {spec.to_mm(head_joint)} * 3"
         )
-        return None
     pattern = ["q"]
     l = wall_width - quater_brick_length
-    n = int(l / (head_joint + full_brick_length + head_joint + half_brick_length))
+    n = l // (head_joint + full_brick_length + head_joint + half_brick_length)
     for _ in range(n):
         pattern.extend(["f", "h"])
     r = l - n * (head_joint + full_brick_length + head_joint + half_brick_length)
-    if not eq(r, 0):
-        if not eq(head_joint + half_brick_length, r):
-            print(
-                f"Error: can't finish remaining {r} width of even course of Flemish bond with a half brick of length {half_brick_length} and joint of size {head_joint}",
-                file=sys.stderr,
+    if r != 0:
+        if head_joint + half_brick_length != r:
+            raise PatternError(
+                f"can't finish remaining {spec.to_mm(r)} width of even course of Flemish bond with a half brick of length {spec.to_mm(half_brick_length)} and joint of size {spec.to_mm(head_joint)}"
             )
-            return None
         pattern.append("h")
     return pattern
 
 
 def get_flemish_bond_odd_course(
-    wall_width, full_brick_length, half_brick_length, quater_brick_length, head_joint
+    wall_width,
+    full_brick_length,
+    half_brick_length,
+    quater_brick_length,
+    head_joint,
+    spec,
 ):
     if (
         wall_width
@@ -249,54 +245,47 @@ def get_flemish_bond_odd_course(
         + half_brick_length
         + 3 * head_joint
     ):
-        print(
-            f"Error: can't generate even course for Flemish bond because",
-            f"wall width {wall_width} is smaller than full brick length {full_brick_length} plus",
-            f"half brick lenght {half_brick_length} * 2 plus quater brick lenght {quater_brick_length} plus head joint {head_joint} * 3",
-            file=sys.stderr,
-            sep="\n",
+        raise PatternError(
+            f"can't generate even course for Flemish bond because "
+            f"wall width {spec.to_mm(wall_width)} is smaller than full brick length {spec.to_mm(full_brick_length)} plus "
+            f"half brick lenght {spec.to_mm(half_brick_length)} * 2 plus quater brick lenght {spec.to_mm(quater_brick_length)} plus head joint {spec.to_mm(head_joint)} * 3"
         )
-        return None
     pattern = ["h"]
     l = wall_width - half_brick_length
-    n = int(l / (head_joint + half_brick_length + head_joint + full_brick_length))
+    n = l // (head_joint + half_brick_length + head_joint + full_brick_length)
     for _ in range(n):
         pattern.extend(["h", "f"])
     r = l - n * (head_joint + half_brick_length + head_joint + full_brick_length)
-    if not eq(r, 0):
-        if not eq(head_joint + quater_brick_length, r):
-            print(
-                f"Error: can't finish remaining {r} width of odd course of Flemish bond with a quater brick of length {quater_brick_length} and joint of size {head_joint}",
-                file=sys.stderr,
+    if r != 0:
+        if head_joint + quater_brick_length != r:
+            raise PatternError(
+                f"can't finish remaining {spec.to_mm(r)} width of odd course of Flemish bond with a quater brick of length {spec.to_mm(quater_brick_length)} and joint of size {spec.to_mm(head_joint)}"
             )
-            return None
         pattern.append("q")
     return pattern
 
 
-def get_flemish_bond_pattern(config: dict):
-    wall_width = config["wall"]["width"]
-    wall_height = config["wall"]["height"]
-    head_joint = config["joints"]["head"]
-    bed_joint = config["joints"]["bed"]
-    brick_height = config["bricks"]["f"]["height"]
-    full_brick_length = config["bricks"]["f"]["length"]
-    half_brick_length = config["bricks"]["h"]["length"]
-    quater_brick_length = config["bricks"]["q"]["length"]
-    course_height = bed_joint + brick_height
-    n_courses = int(wall_height / course_height)
-    if wall_height - course_height * n_courses > EPS:
-        print(
-            f"Error: The wall height {wall_height} can't be represented as a whole number of courses of height {course_height}",
-            file=sys.stderr,
+def get_flemish_bond_pattern(config: WallSpec | dict):
+    spec = as_spec(config)
+    wall_width = spec.wall_width
+    wall_height = spec.wall_height
+    head_joint = spec.head_joint
+    full_brick_length = spec.length("f")
+    half_brick_length = spec.length("h")
+    quater_brick_length = spec.length("q")
+    course_height = spec.course_height
+    n_courses = wall_height // course_height
+    if wall_height != course_height * n_courses:
+        raise PatternError(
+            f"The wall height {spec.to_mm(wall_height)} can't be represented as a whole number of courses of height {spec.to_mm(course_height)}"
         )
-        return None
     even_course = get_flemish_bond_even_course(
         wall_width,
         full_brick_length,
         half_brick_length,
         quater_brick_length,
         head_joint,
+        spec,
     )
     odd_course = get_flemish_bond_odd_course(
         wall_width,
@@ -304,9 +293,8 @@ def get_flemish_bond_pattern(config: dict):
         half_brick_length,
         quater_brick_length,
         head_joint,
+        spec,
     )
-    if even_course is None or odd_course is None:
-        return None
     pattern = []
     for i in range(n_courses):
         if i % 2 == 0:
@@ -316,49 +304,81 @@ def get_flemish_bond_pattern(config: dict):
     return pattern
 
 
-def seq_len(seq: list[BrickWithFallenTeethData], config: dict) -> float:
+def seq_len(seq: list[BrickWithFallenTeethData], spec: WallSpec) -> int:
+    lengths = spec.lengths
+    type_codes = spec.type_codes
     length = 0
     for brick in seq:
-        length += config["bricks"][brick.type]["length"]
+        length += lengths[type_codes[brick.type]]
     if len(seq) > 1:
-        length += config["joints"]["head"] * (len(seq) - 1)
+        length += spec.head_joint * (len(seq) - 1)
     return length
 
 
+def get_course_edges(
+    seq: list[BrickWithFallenTeethData], spec: WallSpec
+) -> tuple[list[int], list[int]]:
+    """
+    Returns the lists of the left edges and the right edges of the bricks in the course
+    Both lists are sorted, so they can be searched with bisect
+    """
+    lengths = spec.lengths
+    type_codes = spec.type_codes
+    lefts = []
+    rights = []
+    x = 0
+    for brick in seq:
+        lefts.append(x)
+        x += lengths[type_codes[brick.type]]
+        rights.append(x)
+        x += spec.head_joint
+    return lefts, rights
+
+
+def count_fallen_teeth(
+    data: BrickWithFallenTeethData,
+    beneath: list[BrickWithFallenTeethData],
+    beneath_rights: list[int],
+    x_right: int,
+    spec: WallSpec,
+):
+    # We add the fallen teeth strike from a break beneath if the difference between
+    # the edge positions has the length of a quater brick (+- joint, depends on the side)
+    # The coordinates are exact, so the brick beneath is found by its right edge
+    q_len = spec.length("q")
+    h_joint = spec.head_joint
+    beneath_by_right = dict(zip(beneath_rights, beneath))
+    left_step = beneath_by_right.get(x_right - h_joint - q_len, None)
+    if left_step is not None:
+        data.n_left_teeth = left_step.n_left_teeth + 1
+    right_step = beneath_by_right.get(x_right + h_joint + q_len, None)
+    if right_step is not None:
+        data.n_right_teeth = right_step.n_right_teeth + 1
+
+
 def gen_full_brick_option(
-    ptrn: list[list[BrickWithFallenTeethData]], course: int, config: dict
+    ptrn: list[list[BrickWithFallenTeethData]], course: int, spec: WallSpec
 ) -> list[BrickWithFallenTeethData]:
     """
     This function returns BrickWithFallenTeethData for full brick if it's possible to lay such brick
     Or None if it if impossible to lay such brick according to the rules
     For now the only rule that can prevent full brick from laying is the fallen teeth rule
     """
-    q_len = config["bricks"]["q"]["length"]
-    f_len = config["bricks"]["f"]["length"]
-    h_joint = config["joints"]["head"]
     if course == 0:
         return BrickWithFallenTeethData("f", 1, 1)
     data = BrickWithFallenTeethData("f", 1, 1)
-    x_left = seq_len(ptrn[course], config) + h_joint
-    x_right = x_left + f_len
-    # Looking at all the bricks beneath the given brick to count the "fallen teeth" strikes
-    # We add the fallen teeth strike from a break beneath if the difference between
-    # the edge positions has the length of a quater brick (+- joint, depends on the side)
-    for i in range(len(ptrn[course - 1])):
-        beneath_type = ptrn[course - 1][i].type
-        beneath_left = seq_len(ptrn[course - 1][:i], config) + h_joint
-        beneath_right = beneath_left + config["bricks"][beneath_type]["length"]
-        if eq(beneath_right + h_joint - x_right, -q_len):
-            data.n_left_teeth = ptrn[course - 1][i].n_left_teeth + 1
-        if eq(beneath_right - x_right - h_joint, q_len):
-            data.n_right_teeth = ptrn[course - 1][i].n_right_teeth + 1
+    x_left = seq_len(ptrn[course], spec) + spec.head_joint if ptrn[course] else 0
+    x_right = x_left + spec.length("f")
+    # Looking at the bricks beneath the given brick to count the "fallen teeth" strikes
+    _, beneath_rights = get_course_edges(ptrn[course - 1], spec)
+    count_fallen_teeth(data, ptrn[course - 1], beneath_rights, x_right, spec)
     if data.n_left_teeth > 5 or data.n_right_teeth > 5:
         return None
     return data
 
 
 def gen_half_brick_option(
-    ptrn: list[list[BrickWithFallenTeethData]], course: int, config: dict
+    ptrn: list[list[BrickWithFallenTeethData]], course: int, spec: WallSpec
 ) -> list[BrickWithFallenTeethData]:
     """
     This function returns BrickWithFallenTeethData for half brick if it's possible to lay such brick
@@ -367,82 +387,91 @@ def gen_half_brick_option(
      1. the fallen teeth rule
      2. "no 2 half bricks next to each other" rule
     """
-    q_len = config["bricks"]["q"]["length"]
-    h_len = config["bricks"]["h"]["length"]
-    h_joint = config["joints"]["head"]
     # checking if the previous brick (brick to the left) is a half brick
     if len(ptrn[course]) >= 1 and ptrn[course][-1].type == "h":
         return None
     if course == 0:
         return BrickWithFallenTeethData("h", 1, 1)
     data = BrickWithFallenTeethData("h", 1, 1)
-    x_left = seq_len(ptrn[course], config) + h_joint
-    x_right = x_left + h_len
-    # Looking at all the bricks beneath the given brick to count the "fallen teeth" strikes
-    # We add the fallen teeth strike from a break beneath if the difference between
-    # the edge positions has the length of a quater brick (+- joint, depends on the side)
-    # Also looking if the brick beneath is a half brick (also forbidden)
-    for i in range(len(ptrn[course - 1])):
-        beneath_type = ptrn[course - 1][i].type
-        beneath_left = seq_len(ptrn[course - 1][:i], config) + h_joint
-        beneath_right = beneath_left + config["bricks"][beneath_type]["length"]
-        if eq(beneath_right + h_joint - x_right, -q_len):
-            data.n_left_teeth = ptrn[course - 1][i].n_left_teeth + 1
-        if eq(beneath_right - x_right - h_joint, q_len):
-            data.n_right_teeth = ptrn[course - 1][i].n_right_teeth + 1
-        if beneath_left <= x_right and beneath_right >= x_left and beneath_type == "h":
-            return None
+    x_left = seq_len(ptrn[course], spec) + spec.head_joint if ptrn[course] else 0
+    x_right = x_left + spec.length("h")
+    beneath = ptrn[course - 1]
+    beneath_lefts, beneath_rights = get_course_edges(beneath, spec)
+    # Looking if any brick right beneath the given brick is a half brick (forbidden)
+    first = bisect.bisect_left(beneath_rights, x_left)
+    last = bisect.bisect_right(beneath_lefts, x_right)
+    if any(brick.type == "h" for brick in beneath[first:last]):
+        return None
+    # Looking at the bricks beneath the given brick to count the "fallen teeth" strikes
+    count_fallen_teeth(data, beneath, beneath_rights, x_right, spec)
     if data.n_left_teeth > 5 or data.n_right_teeth > 5:
         return None
     return data
 
 
 def gen_wild_options(
-    ptrn: list[list[BrickWithFallenTeethData]], course: int, config: dict
+    ptrn: list[list[BrickWithFallenTeethData]], course: int, spec: WallSpec
 ) -> list[BrickWithFallenTeethData]:
     options = []
-    full_brick_option = gen_full_brick_option(ptrn, course, config)
+    full_brick_option = gen_full_brick_option(ptrn, course, spec)
     if full_brick_option:
         options.append(full_brick_option)
-    half_brick_option = gen_half_brick_option(ptrn, course, config)
+    half_brick_option = gen_half_brick_option(ptrn, course, spec)
     if half_brick_option:
         options.append(half_brick_option)
     return options
 
 
-def get_wild_bond_pattern(config: dict) -> list[list[str]]:
-    wall_w: float = config["wall"]["width"]
-    wall_h: float = config["wall"]["height"]
-    h_joint: float = config["joints"]["head"]
-    bed_joint: float = config["joints"]["bed"]
-    brick_height: float = config["bricks"]["f"]["height"]
-    f_len: float = config["bricks"]["f"]["length"]
-    h_len: float = config["bricks"]["h"]["length"]
-    d_len: float = config["bricks"]["d"]["length"]
-    course_height = bed_joint + brick_height
-    n_courses = int(wall_h / course_height)
-    if not eq(wall_h, course_height * n_courses):
-        print(
-            f"Error: The wall height {wall_h} can't be represented as a whole number of courses of height {course_height}",
-            file=sys.stderr,
+def iter_wild_bond_courses(
+    config: WallSpec | dict,
+    window: int | None = None,
+    rng: random.Random | None = None,
+):
+    """
+    Generates the wild bond pattern course by course and yields every course (as a list of brick types)
+    as soon as it is final. Raises PatternError if the pattern can't be generated
+    The random choices are drawn from rng, a new random.Random() by default, so concurrent
+    generations don't share any state and a seeded rng gives the same pattern every time
+
+    Every course depends only on the course beneath it, but when a course can't be finished
+    the generator goes back and regenerates the course beneath. Only the last `window` finished
+    courses (all of them if window is None) are kept for going back, older courses are yielded
+    and forgotten, so the memory doesn't grow with the height of the wall
+    """
+    spec = as_spec(config)
+    if rng is None:
+        rng = random.Random()
+    wall_w: int = spec.wall_width
+    wall_h: int = spec.wall_height
+    h_joint: int = spec.head_joint
+    f_len: int = spec.length("f")
+    h_len: int = spec.length("h")
+    d_len: int = spec.length("d")
+    course_height = spec.course_height
+    n_courses = wall_h // course_height
+    if wall_h != course_height * n_courses:
+        raise PatternError(
+            f"The wall height {spec.to_mm(wall_h)} can't be represented as a whole number of courses of height {spec.to_mm(course_height)}"
         )
-        return None
     course = 0
-    ptrn: list[list[BrickWithFallenTeethData]] = [[] for _ in range(n_courses)]
+    # The courses in memory by their numbers, the courses below n_final_courses are already yielded
+    # The course right beneath the first not yielded course is kept for the fallen teeth checks
+    ptrn: dict[int, list[BrickWithFallenTeethData]] = {}
+    n_final_courses = 0
     n_full_course_retries = 0
     while course < n_courses:
         if n_full_course_retries >= 100:
-            print(
-                "Retried full courses 100 times, now at course {course}, giving up",
-                file=sys.stderr,
+            raise PatternError(
+                f"Retried full courses 100 times, now at course {course}, giving up"
             )
-            return None
+        if course not in ptrn:
+            ptrn[course] = []
         if course % 2 == 0:
             finish_len = h_joint + d_len + h_joint + h_len
             n_retries = 0
             should_regenerate_full_rows = False
-            while wall_w - seq_len(ptrn[course], config) - finish_len > EPS:
-                options = gen_wild_options(ptrn, course, config)
+            while wall_w - seq_len(ptrn[course], spec) - finish_len > 0:
+                options = gen_wild_options(ptrn, course, spec)
                 if len(options) == 0:
                     # we regenerate 5 last bricks or all bricks in this course if there were less
                     if len(ptrn[course]) <= 5:
@@ -454,25 +483,26 @@ def get_wild_bond_pattern(config: dict) -> list[list[str]]:
                 if n_retries >= 10:
                     should_regenerate_full_rows = True
                     break
-                ptrn[course].append(random.choice(options))
+                ptrn[course].append(rng.choice(options))
 
             if should_regenerate_full_rows:
                 n_full_course_retries += 1
                 ptrn[course] = []
-                if course > 0:
+                if course > n_final_courses:
                     ptrn[course - 1] = []
                     course = course - 1
                     continue
+                elif course > 0:
+                    # the course beneath is already yielded, so only this course is generated again
+                    continue
                 else:
-                    print(
-                        f"Failed to generate course 0 according to the constrains",
-                        file=sys.stderr,
+                    raise PatternError(
+                        f"Failed to generate course 0 according to the constrains"
                     )
-                    return None
 
             finish_with_hd_len = h_joint + h_len + h_joint + d_len
             finish_with_d_len = h_joint + d_len
-            if eq(wall_w - seq_len(ptrn[course], config), finish_with_hd_len):
+            if wall_w - seq_len(ptrn[course], spec) == finish_with_hd_len:
                 if ptrn[course][-1].type == "h":
                     ptrn[course].pop()
                     ptrn[course].append(BrickWithFallenTeethData("f", 1, 1))
@@ -480,21 +510,19 @@ def get_wild_bond_pattern(config: dict) -> list[list[str]]:
                 else:
                     ptrn[course].append(BrickWithFallenTeethData("h", 1, 1))
                     ptrn[course].append(BrickWithFallenTeethData("d", 1, 1))
-            elif eq(wall_w - seq_len(ptrn[course], config), finish_with_d_len):
+            elif wall_w - seq_len(ptrn[course], spec) == finish_with_d_len:
                 ptrn[course].append(BrickWithFallenTeethData("d", 1, 1))
             else:
-                print(
-                    f"Error: can't finish remaining {wall_w - seq_len(ptrn[course])} width of course {course} of wild bond",
-                    file=sys.stderr,
+                raise PatternError(
+                    f"can't finish remaining {spec.to_mm(wall_w - seq_len(ptrn[course], spec))} width of course {course} of wild bond"
                 )
-                return None
             course += 1
         elif course % 2 == 1:
             ptrn[course].append(BrickWithFallenTeethData("d", 1, 1))
             n_retries = 0
             should_regenerate_full_rows = False
-            while wall_w - seq_len(ptrn[course], config) - (h_joint + f_len) > EPS:
-                options = gen_wild_options(ptrn, course, config)
+            while wall_w - seq_len(ptrn[course], spec) - (h_joint + f_len) > 0:
+                options = gen_wild_options(ptrn, course, spec)
                 if len(options) == 0:
                     # we regenerate 5 last bricks but we keep the first driklezoor brick
                     if len(ptrn[course]) <= 5:
@@ -506,40 +534,75 @@ def get_wild_bond_pattern(config: dict) -> list[list[str]]:
                 if n_retries >= 10:
                     should_regenerate_full_rows = True
                     break
-                ptrn[course].append(random.choice(options))
+                ptrn[course].append(rng.choice(options))
             if should_regenerate_full_rows:
                 n_full_course_retries += 1
                 ptrn[course] = []
-                ptrn[course - 1] = []
-                course = course - 1
+                if course > n_final_courses:
+                    ptrn[course - 1] = []
+                    course = course - 1
                 continue
-            if eq(wall_w - seq_len(ptrn[course], config), h_joint + f_len):
+            if wall_w - seq_len(ptrn[course], spec) == h_joint + f_len:
                 ptrn[course].append(BrickWithFallenTeethData("f", 1, 1))
-            elif eq(wall_w - seq_len(ptrn[course], config), h_joint + h_len):
+            elif wall_w - seq_len(ptrn[course], spec) == h_joint + h_len:
                 ptrn[course].append(BrickWithFallenTeethData("h", 1, 1))
             else:
-                print(
-                    f"Error: can't finish remaining {wall_w - seq_len(ptrn[course])} width of course {course} of wild bond",
-                    file=sys.stderr,
+                raise PatternError(
+                    f"can't finish remaining {spec.to_mm(wall_w - seq_len(ptrn[course], spec))} width of course {course} of wild bond"
                 )
-                return None
             course += 1
-    return [[x.type for x in c] for c in ptrn]
-
-
-def get_pattern(config: dict) -> list[list[str]]:
-    bond = config.get("bond", None)
+        if window is not None and n_final_courses < course - window:
+            while n_final_courses < course - window:
+                yield [x.type for x in ptrn[n_final_courses]]
+                ptrn.pop(n_final_courses - 1, None)
+                n_final_courses += 1
+            # the retries limit the work on the courses in memory, not on the whole wall
+            n_full_course_retries = 0
+    while n_final_courses < n_courses:
+        yield [x.type for x in ptrn[n_final_courses]]
+        n_final_courses += 1
+
+
+def get_wild_bond_pattern(
+    config: WallSpec | dict, rng: random.Random | None = None
+) -> list[list[str]]:
+    return list(iter_wild_bond_courses(config, rng=rng))
+
+
+def get_pattern(
+    config: WallSpec | dict, rng: random.Random | None = None
+) -> list[list[str]]:
+    """
+    Raises PatternError if the pattern of the bond can't be generated for the wallconfig
+    rng is only used by the wild bond, see iter_wild_bond_courses
+    """
+    spec = as_spec(config)
+    bond = spec.bond
     if bond == "stretcher":
-        return get_stretcher_bond_pattern(config)
+        return get_stretcher_bond_pattern(spec)
     elif bond == "english cross":
-        return get_english_cross_bond_pattern(config)
+        return get_english_cross_bond_pattern(spec)
     elif bond == "flemish":
-        return get_flemish_bond_pattern(config)
+        return get_flemish_bond_pattern(spec)
     elif bond == "wild":
-        return get_wild_bond_pattern(config)
+        return get_wild_bond_pattern(spec, rng)
     else:
-        print(f"bond {bond} unsupported", file=sys.stderr)
-        return None
+        raise PatternError(f"bond {bond} unsupported")
+
+
+def iter_pattern(config: WallSpec | dict, rng: random.Random | None = None):
+    """
+    Yields the courses of the pattern bottom to top as soon as they are generated
+    Raises PatternError on failure, possibly after some courses are already yielded
+    Only the wild bond is really generated course by course, the other bonds are cheap to generate at once
+    """
+    spec = as_spec(config)
+    if spec.bond == "wild":
+        yield from iter_wild_bond_courses(
+            spec, window=WILD_BOND_STREAMING_WINDOW, rng=rng
+        )
+        return
+    yield from get_pattern(spec)
 
 
 def print_pattern(pattern: list[list[str]]):
@@ -0,0 +1,269 @@
+from typing import NamedTuple
+
+from .simulate import (
+    MachineProfile,
+    check_lay_times,
+    get_arm_time,
+    get_brick_centers,
+    get_lay_time,
+    get_move_time,
+)
+from .steps import Point, PositionInPattern, Stride, get_bricks_beneath
+from .wallspec import WallSpec, as_spec
+
+
+class ScheduledStride(NamedTuple):
+    # None if the machine only moves aside to make room for another machine
+    stride_n: int | None
+    envelope_pos: Point
+    start: float
+    end: float
+
+
+class Schedule(NamedTuple):
+    timelines: list[list[ScheduledStride]]
+    makespan: float
+
+
+def get_stride_dependencies(
+    instructions: list[Stride], config: WallSpec | dict, pattern: list[list[str]]
+) -> list[set[int]]:
+    """
+    Returns for every stride the numbers of the other strides that lay bricks right beneath its bricks
+    A stride can start only after all of them are finished
+    """
+    spec = as_spec(config)
+    stride_of_brick: dict[PositionInPattern, int] = {}
+    for stride_n, stride in enumerate(instructions):
+        for brick in stride.steps:
+            stride_of_brick[brick] = stride_n
+    dependencies = []
+    for stride_n, stride in enumerate(instructions):
+        stride_dependencies = set()
+        for brick in stride.steps:
+            for beneath in get_bricks_beneath(brick, spec, pattern):
+                stride_dependencies.add(stride_of_brick[beneath])
+        stride_dependencies.discard(stride_n)
+        dependencies.append(stride_dependencies)
+    return dependencies
+
+
+def intervals_overlap(a: tuple[int, int], b: tuple[int, int]) -> bool:
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def schedule_strides(
+    instructions: list[Stride],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    n_machines: int,
+    profile: MachineProfile,
+) -> Schedule:
+    """
+    Assigns the strides of a plan to at most n_machines machines working on the wall
+    at the same time, see greedy_schedule
+    More machines in the greedy schedule aren't always faster: the idle machines stay
+    where they finished and get in the way of the others. So I schedule 1 to n_machines
+    machines and return the fastest schedule, the machines it doesn't use stay off the wall
+    and have empty timelines. The makespan never grows with n_machines
+    """
+    if n_machines < 1:
+        raise ValueError(
+            f"the number of machines should be at least 1, got {n_machines}"
+        )
+    spec = as_spec(config)
+    check_lay_times(profile, pattern)
+    dependencies = get_stride_dependencies(instructions, spec, pattern)
+    centers = get_brick_centers(spec, pattern)
+    best = None
+    for n in range(1, n_machines + 1):
+        schedule = greedy_schedule(
+            instructions, spec, pattern, n, profile, dependencies, centers
+        )
+        # a tie goes to fewer machines
+        if best is None or schedule.makespan < best.makespan:
+            best = schedule
+    unused: list[list[ScheduledStride]] = [
+        [] for _ in range(n_machines - len(best.timelines))
+    ]
+    return Schedule(best.timelines + unused, best.makespan)
+
+
+def greedy_schedule(
+    instructions: list[Stride],
+    spec: WallSpec,
+    pattern: list[list[str]],
+    n_machines: int,
+    profile: MachineProfile,
+    dependencies: list[set[int]],
+    centers: list[list[tuple[float, float]]],
+) -> Schedule:
+    """
+    Assigns the strides of a plan to n_machines machines working on the wall at the same time
+    Whenever a machine is idle it takes the first stride of the plan that has all the strides
+    beneath it finished and that it can reach without touching the other machines
+    The machines stand side by side, so only the horizontal extent of the envelopes matters:
+    a machine occupies its envelope, also when it is idle, and while moving it occupies
+    everything between the envelope it leaves and the envelope it goes to
+    Every machine starts at the envelope position of its first stride
+    If all the machines are idle and none can take a stride, the machine nearest to the first
+    ready stride takes it and the machines in its way move aside first, one after another
+    """
+    width = spec.envelope_width
+    finish_times: dict[int, float] = {}
+    timelines: list[list[ScheduledStride]] = [[] for _ in range(n_machines)]
+    free_at = [0.0] * n_machines
+    positions: list[Point | None] = [None] * n_machines
+    # the x the last move of every machine started from and the time it ended
+    moves: list[tuple[int, float] | None] = [None] * n_machines
+    running: list[ScheduledStride] = []
+    pending = list(range(len(instructions)))
+    time = 0.0
+
+    def occupied(machine: int) -> tuple[int, int] | None:
+        if positions[machine] is None:
+            return None
+        x = positions[machine].x
+        if moves[machine] is not None and moves[machine][1] > time:
+            from_x = moves[machine][0]
+            return min(from_x, x), max(from_x, x) + width
+        return x, x + width
+
+    def swept(machine: int, x: int) -> tuple[int, int]:
+        if positions[machine] is None:
+            return x, x + width
+        return min(positions[machine].x, x), max(positions[machine].x, x) + width
+
+    def is_clear(machine: int, x: int) -> bool:
+        path = swept(machine, x)
+        for other in range(n_machines):
+            other_occupied = occupied(other)
+            if (
+                other != machine
+                and other_occupied is not None
+                and intervals_overlap(path, other_occupied)
+            ):
+                return False
+        return True
+
+    def is_ready(stride_n: int) -> bool:
+        return all(
+            finish_times.get(dependency, time + 1) <= time
+            for dependency in dependencies[stride_n]
+        )
+
+    def move(
+        machine: int, stride_n: int | None, to: Point, start: float, work_time: float
+    ):
+        move_time = 0.0
+        from_x = to.x
+        if positions[machine] is not None:
+            move_time = get_move_time(profile, positions[machine], to, spec)
+            from_x = positions[machine].x
+        end = start + move_time + work_time
+        moves[machine] = (from_x, start + move_time)
+        positions[machine] = to
+        free_at[machine] = end
+        scheduled = ScheduledStride(stride_n, to, start, end)
+        timelines[machine].append(scheduled)
+        return scheduled
+
+    def start_stride(machine: int, stride_n: int, start: float):
+        stride = instructions[stride_n]
+        work_time = (
+            profile.setup_time
+            + get_arm_time(profile, stride, spec, pattern, centers)
+            + get_lay_time(profile, stride, pattern)
+        )
+        scheduled = move(machine, stride_n, stride.envelope_pos, start, work_time)
+        running.append(scheduled)
+        finish_times[stride_n] = scheduled.end
+        pending.remove(stride_n)
+
+    def push_aside(machine: int, x: int) -> float:
+        """
+        Moves the idle machines in the way of the machine going to x out of the way,
+        keeping their order along the wall. Returns the time it takes
+        """
+        machine_x = positions[machine].x
+        others = [
+            other
+            for other in range(n_machines)
+            if other != machine and positions[other] is not None
+        ]
+        if x >= machine_x:
+            # the machines to the right are pushed to the right one after another
+            others = sorted(
+                (o for o in others if positions[o].x > machine_x),
+                key=lambda o: positions[o].x,
+            )
+            limit = x + width
+            new_xs = []
+            for other in others:
+                new_x = max(positions[other].x, limit)
+                new_xs.append(new_x)
+                limit = new_x + width
+        else:
+            others = sorted(
+                (o for o in others if positions[o].x < machine_x),
+                key=lambda o: -positions[o].x,
+            )
+            limit = x
+            new_xs = []
+            for other in others:
+                new_x = min(positions[other].x, limit - width)
+                new_xs.append(new_x)
+                limit = new_x
+        # The farthest machine moves first and every machine starts moving only after
+        # the machine ahead of it has left, so the swept paths never overlap
+        start = time
+        for other, new_x in reversed(list(zip(others, new_xs))):
+            if new_x != positions[other].x:
+                to = Point(new_x, positions[other].y)
+                start = move(other, None, to, start, 0.0).end
+        return start - time
+
+    while pending:
+        running = [r for r in running if r.end > time]
+        for machine in range(n_machines):
+            if free_at[machine] > time:
+                continue
+            for stride_n in pending:
+                if is_ready(stride_n) and is_clear(
+                    machine, instructions[stride_n].envelope_pos.x
+                ):
+                    start_stride(machine, stride_n, time)
+                    break
+        if pending and not running:
+            # All the machines are idle and stand in the way of each other
+            stride_n = next((n for n in pending if is_ready(n)), None)
+            if stride_n is None:
+                raise ValueError(
+                    "the strides beneath the pending strides are never laid"
+                )
+            x = instructions[stride_n].envelope_pos.x
+            machine = min(
+                (m for m in range(n_machines) if positions[m] is not None),
+                key=lambda m: abs(positions[m].x - x),
+            )
+            start_stride(machine, stride_n, time + push_aside(machine, x))
+        # Nothing else can start before one of the running strides is finished
+        if pending:
+            time = min(r.end for r in running if r.end > time)
+    return Schedule(timelines, max(finish_times.values(), default=0.0))
+
+
+def print_schedule(schedule: Schedule):
+    for machine, timeline in enumerate(schedule.timelines):
+        if not timeline:
+            print(f"machine {machine + 1} stays off the wall")
+        for scheduled in timeline:
+            if scheduled.stride_n is None:
+                what = "moves aside"
+            else:
+                what = f"stride {scheduled.stride_n + 1}"
+            print(
+                f"machine {machine + 1} {what} start {scheduled.start:.1f}"
+                f" end {scheduled.end:.1f}"
+            )
+    print(f"makespan {schedule.makespan:.1f}")
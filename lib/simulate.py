@@ -0,0 +1,238 @@
+import math
+import tomllib
+
+from typing import NamedTuple
+
+from .steps import Point, PositionInPattern, Stride
+from .wallspec import WallSpec, as_spec
+
+
+class MachineProfileError(ValueError):
+    pass
+
+
+class MachineProfile(NamedTuple):
+    # seconds to lay a brick of each type
+    lay_times: dict[str, float]
+    # envelope move speeds in mm per second, the axes move at the same time
+    move_speed_x: float
+    move_speed_y: float
+    # seconds to set up the machine at a new envelope position
+    setup_time: float
+    # speed of the arm moving between the bricks inside the envelope in mm per second,
+    # None if the profile has no [arm] section and the arm travel isn't estimated
+    arm_speed: float | None = None
+
+
+class StrideTimes(NamedTuple):
+    start: float
+    move_time: float
+    setup_time: float
+    lay_time: float
+    arm_time: float = 0.0
+
+
+class SimulationContext(NamedTuple):
+    # the speeds in units per second, so the positions don't have to be converted to mm
+    speed_x: float
+    speed_y: float
+    setup_time: float
+    # None if the arm travel isn't estimated
+    arm_speed: float | None
+    # lay time of every brick, indexed as the pattern
+    lay_times: list[list[float]]
+    # centers of the bricks for the arm travel, None if the arm travel isn't estimated
+    centers: list[list[tuple[float, float]]] | None
+
+
+class Simulation(NamedTuple):
+    makespan: float
+    # time the machine spends not laying bricks, i. e. moving, setting up and moving the arm
+    idle_time: float
+    strides: list[StrideTimes]
+
+
+def get_positive_number(section: dict, path: str, key: str) -> float:
+    value = section.get(key, None)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise MachineProfileError(
+            f"{path}.{key} should be a positive number, got {value!r}"
+        )
+    return value
+
+
+def compile_profile(config: dict) -> MachineProfile:
+    """
+    Validates the machineconfig loaded from TOML, see default.machineconfig
+    """
+    lay_time = config.get("lay_time", None)
+    move = config.get("move", None)
+    stride = config.get("stride", None)
+    for name, section in [("lay_time", lay_time), ("move", move), ("stride", stride)]:
+        if not isinstance(section, dict):
+            raise MachineProfileError(f"machineconfig has no [{name}] section")
+    arm = config.get("arm", None)
+    if arm is not None and not isinstance(arm, dict):
+        raise MachineProfileError("[arm] of machineconfig should be a section")
+    return MachineProfile(
+        lay_times={
+            brick_type: get_positive_number(lay_time, "lay_time", brick_type)
+            for brick_type in lay_time
+        },
+        move_speed_x=get_positive_number(move, "move", "speed_x"),
+        move_speed_y=get_positive_number(move, "move", "speed_y"),
+        setup_time=get_positive_number(stride, "stride", "setup_time"),
+        arm_speed=get_positive_number(arm, "arm", "speed") if arm is not None else None,
+    )
+
+
+def load_profile(file) -> MachineProfile:
+    return compile_profile(tomllib.load(file))
+
+
+def check_lay_times(profile: MachineProfile, pattern: list[list[str]]):
+    for course in pattern:
+        for brick_type in course:
+            if brick_type not in profile.lay_times:
+                raise MachineProfileError(
+                    f"machineconfig has no lay time for brick type {brick_type}"
+                )
+
+
+def get_move_time(
+    profile: MachineProfile, a: Point, b: Point, config: WallSpec | dict
+) -> float:
+    spec = as_spec(config)
+    dx = abs(a.x - b.x) / spec.units_per_mm
+    dy = abs(a.y - b.y) / spec.units_per_mm
+    return max(dx / profile.move_speed_x, dy / profile.move_speed_y)
+
+
+def get_lay_time(
+    profile: MachineProfile, stride: Stride, pattern: list[list[str]]
+) -> float:
+    lay_times = profile.lay_times
+    return sum(lay_times[pattern[brick.y][brick.x]] for brick in stride.steps)
+
+
+def get_brick_centers(
+    config: WallSpec | dict, pattern: list[list[str]]
+) -> list[list[tuple[float, float]]]:
+    """
+    Returns the centers of all the bricks of the pattern, indexed as the pattern
+    The arm moves between the brick centers
+    """
+    spec = as_spec(config)
+    centers = []
+    for y, course in enumerate(pattern):
+        center_y = y * spec.course_height + spec.brick_height / 2
+        course_centers = []
+        left = 0
+        for brick_type in course:
+            length = spec.length(brick_type)
+            course_centers.append((left + length / 2, center_y))
+            left += length + spec.head_joint
+        centers.append(course_centers)
+    return centers
+
+
+def get_arm_path_length(
+    envelope_pos: Point,
+    bricks: list[PositionInPattern],
+    centers: list[list[tuple[float, float]]],
+) -> float:
+    # The arm starts at the envelope position and visits the bricks in the order they are layed
+    x, y = envelope_pos
+    length = 0.0
+    for brick in bricks:
+        next_x, next_y = centers[brick.y][brick.x]
+        length += math.hypot(next_x - x, next_y - y)
+        x, y = next_x, next_y
+    return length
+
+
+def get_arm_time(
+    profile: MachineProfile,
+    stride: Stride,
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    centers: list[list[tuple[float, float]]] | None = None,
+) -> float:
+    if profile.arm_speed is None:
+        return 0.0
+    spec = as_spec(config)
+    if centers is None:
+        centers = get_brick_centers(spec, pattern)
+    path_length = get_arm_path_length(stride.envelope_pos, stride.steps, centers)
+    return path_length / spec.units_per_mm / profile.arm_speed
+
+
+def prepare_simulation(
+    config: WallSpec | dict, pattern: list[list[str]], profile: MachineProfile
+) -> SimulationContext:
+    """
+    Looks up everything simulate needs that doesn't depend on the plan. It walks the whole
+    pattern, so compute it once per wall and pass it to simulate for every candidate plan
+    """
+    spec = as_spec(config)
+    check_lay_times(profile, pattern)
+    arm_speed = profile.arm_speed * spec.units_per_mm if profile.arm_speed else None
+    return SimulationContext(
+        speed_x=profile.move_speed_x * spec.units_per_mm,
+        speed_y=profile.move_speed_y * spec.units_per_mm,
+        setup_time=profile.setup_time,
+        arm_speed=arm_speed,
+        lay_times=[
+            [profile.lay_times[brick_type] for brick_type in course]
+            for course in pattern
+        ],
+        centers=get_brick_centers(spec, pattern) if arm_speed else None,
+    )
+
+
+def simulate(
+    instructions: list[Stride],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    profile: MachineProfile,
+    context: SimulationContext | None = None,
+) -> Simulation:
+    """
+    Estimates the time one machine needs to execute the plan
+    The machine starts at the envelope position of the first stride
+    The context from prepare_simulation is computed for the call if it isn't given.
+    With a context the call only walks the plan, so it is cheap to call it for many
+    candidate plans of the same wall
+    """
+    if context is None:
+        context = prepare_simulation(config, pattern, profile)
+    speed_x, speed_y, setup_time, arm_speed, lay_times, centers = context
+
+    strides = []
+    time = 0.0
+    total_lay_time = 0.0
+    previous_x, previous_y = instructions[0].envelope_pos if instructions else (0, 0)
+    for stride in instructions:
+        x, y = stride.envelope_pos
+        move_time = max(abs(x - previous_x) / speed_x, abs(y - previous_y) / speed_y)
+        lay_time = sum([lay_times[brick.y][brick.x] for brick in stride.steps])
+        arm_time = 0.0
+        if arm_speed:
+            arm_time = (
+                get_arm_path_length(stride.envelope_pos, stride.steps, centers)
+                / arm_speed
+            )
+        strides.append(StrideTimes(time, move_time, setup_time, lay_time, arm_time))
+        time += move_time + setup_time + arm_time + lay_time
+        total_lay_time += lay_time
+        previous_x, previous_y = x, y
+    return Simulation(time, time - total_lay_time, strides)
+
+
+def print_simulation(simulation: Simulation):
+    for stride_n, times in enumerate(simulation.strides):
+        print(
+            f"stride {stride_n + 1} start {times.start:.1f} move {times.move_time:.1f} "
+            f"setup {times.setup_time:.1f} arm {times.arm_time:.1f} lay {times.lay_time:.1f}"
+        )
+    print(f"makespan {simulation.makespan:.1f} idle {simulation.idle_time:.1f}")
@@ -1,14 +1,19 @@
+import bisect
+
 from typing import NamedTuple
 
+from .wallspec import WallSpec, as_spec
+
 
 class PositionInPattern(NamedTuple):
     x: int
     y: int
 
 
+# Coordinates on the wall in the integer units of the WallSpec
 class Point(NamedTuple):
-    x: float
-    y: float
+    x: int
+    y: int
 
 
 class Stride(NamedTuple):
@@ -17,20 +22,19 @@ class Stride(NamedTuple):
 
 
 def brick_bottom_left(
-    brick: PositionInPattern, config: dict, pattern: list[list[str]]
+    brick: PositionInPattern, config: WallSpec | dict, pattern: list[list[str]]
 ) -> Point:
-    bed_joint = config["joints"]["bed"]
-    head_joint = config["joints"]["head"]
+    spec = as_spec(config)
+    head_joint = spec.head_joint
+    lengths = spec.lengths
+    type_codes = spec.type_codes
 
-    brick_height = config["bricks"][pattern[brick.y][brick.x]]["height"]
-    course_height = brick_height + bed_joint
-    y = brick.y * course_height
+    y = brick.y * spec.course_height
 
     x = 0
+    course = pattern[brick.y]
     for prev_pos in range(brick.x):
-        prev_brick_type = pattern[brick.y][prev_pos]
-        prev_brick_length = config["bricks"][prev_brick_type]["length"]
-        x += prev_brick_length + head_joint
+        x += lengths[type_codes[course[prev_pos]]] + head_joint
 
     return Point(x, y)
 
@@ -55,18 +59,41 @@ def find_leftmost_bottomest_unlayed_brick(
     return brick
 
 
+def get_bricks_beneath(
+    brick: PositionInPattern, config: WallSpec | dict, pattern: list[list[str]]
+) -> set[PositionInPattern]:
+    if brick.y == 0:
+        return set()
+    spec = as_spec(config)
+    lengths = spec.lengths
+    type_codes = spec.type_codes
+    brick_left = brick_bottom_left(brick, spec, pattern).x
+    brick_right = brick_left + lengths[type_codes[pattern[brick.y][brick.x]]]
+    beneath = set()
+    # walking along the course beneath, summing up the lengths as brick_bottom_left does
+    other_left = 0
+    for other_x, other_type in enumerate(pattern[brick.y - 1]):
+        other_right = other_left + lengths[type_codes[other_type]]
+        if other_left <= brick_right and other_right >= brick_left:
+            beneath.add(PositionInPattern(other_x, brick.y - 1))
+        other_left = other_right + spec.head_joint
+    return beneath
+
+
 def can_lay(
     brick: PositionInPattern,
     envelope_pos: Point,
     remaining_bricks: set[PositionInPattern],
-    config: dict,
+    config: WallSpec | dict,
     pattern: list[list[str]],
 ) -> bool:
-    brick_bottom_left_x, brick_bottom_left_y = brick_bottom_left(brick, config, pattern)
-    brick_length = config["bricks"][pattern[brick.y][brick.x]]["length"]
-    brick_height = config["bricks"][pattern[brick.y][brick.x]]["height"]
-    envelope_height = config["envelope"]["height"]
-    envelope_width = config["envelope"]["width"]
+    spec = as_spec(config)
+    brick_bottom_left_x, brick_bottom_left_y = brick_bottom_left(brick, spec, pattern)
+    brick_code = spec.type_codes[pattern[brick.y][brick.x]]
+    brick_length = spec.lengths[brick_code]
+    brick_height = spec.heights[brick_code]
+    envelope_height = spec.envelope_height
+    envelope_width = spec.envelope_width
 
     # Here I check that the brick is completely within the envelope
     # I'm not checking that the joints around this brick are whithin the envelope
@@ -80,34 +107,23 @@ def can_lay(
         return False
 
     # Here I check that all the bricks right beneath the given brick are already layed
-    if brick.y == 0:
-        return True
-    for other_x, other_type in enumerate(pattern[brick.y - 1]):
-        other_pos = PositionInPattern(other_x, brick.y - 1)
-        other_left = brick_bottom_left(other_pos, config, pattern).x
-        other_right = other_left + config["bricks"][other_type]["length"]
-        is_right_beneath = (
-            other_left <= brick_bottom_left_x + brick_length
-            and other_right >= brick_bottom_left_x
-        )
-        if is_right_beneath and other_pos in remaining_bricks:
-            return False
-    return True
+    return remaining_bricks.isdisjoint(get_bricks_beneath(brick, spec, pattern))
 
 
 def lay_bricks(
     envelope_pos: Point,
     remaining_bricks: set[PositionInPattern],
-    config: dict,
+    config: WallSpec | dict,
     pattern: list[list[str]],
 ) -> list[PositionInPattern]:
+    spec = as_spec(config)
     # I don't want to alter the passed remaining_bricks
     remaining_bricks = remaining_bricks.copy()
     layed_bricks = []
     while True:
         next_brick = None
         for brick in remaining_bricks:
-            if can_lay(brick, envelope_pos, remaining_bricks, config, pattern):
+            if can_lay(brick, envelope_pos, remaining_bricks, spec, pattern):
                 next_brick = brick
                 break
         if next_brick:
@@ -118,50 +134,393 @@ def lay_bricks(
     return layed_bricks
 
 
+class CandidateMemo(NamedTuple):
+    # how many bricks lay_bricks lays from the envelope position
+    n_layed_bricks: dict[Point, int]
+    # the envelope positions whose result depends on the brick being unlayed
+    dependents: dict[PositionInPattern, set[Point]]
+
+
+def get_envelope_dependencies(
+    envelope_pos: Point, config: WallSpec | dict, pattern: list[list[str]]
+) -> set[PositionInPattern]:
+    """
+    Returns the bricks that lay_bricks looks at for the envelope position: the bricks inside
+    the envelope and the bricks right beneath them. It is a superset, I take all the bricks
+    of the courses of the envelope and the course below it that overlap the envelope horizontally
+    """
+    spec = as_spec(config)
+    lengths = spec.lengths
+    type_codes = spec.type_codes
+    envelope_right = envelope_pos.x + spec.envelope_width
+    first_course = max(0, envelope_pos.y // spec.course_height - 1)
+    last_course = min(
+        len(pattern) - 1, (envelope_pos.y + spec.envelope_height) // spec.course_height
+    )
+    dependencies = set()
+    for y in range(first_course, last_course + 1):
+        left = 0
+        for x, brick_type in enumerate(pattern[y]):
+            right = left + lengths[type_codes[brick_type]]
+            if left > envelope_right:
+                break
+            if right >= envelope_pos.x:
+                dependencies.add(PositionInPattern(x, y))
+            left = right + spec.head_joint
+    return dependencies
+
+
+def forget_layed_bricks(memo: CandidateMemo, layed_bricks: list[PositionInPattern]):
+    # Laying a brick changes the result only for the envelope positions that depend on it
+    for brick in layed_bricks:
+        for envelope_pos in memo.dependents.pop(brick, ()):
+            memo.n_layed_bricks.pop(envelope_pos, None)
+
+
+def count_layed_bricks(
+    envelope_pos: Point,
+    remaining_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memo: CandidateMemo | None,
+) -> int:
+    spec = as_spec(config)
+    if memo is None:
+        return len(lay_bricks(envelope_pos, remaining_bricks, spec, pattern))
+    n_layed_bricks = memo.n_layed_bricks.get(envelope_pos, None)
+    if n_layed_bricks is None:
+        n_layed_bricks = len(lay_bricks(envelope_pos, remaining_bricks, spec, pattern))
+        memo.n_layed_bricks[envelope_pos] = n_layed_bricks
+        for brick in get_envelope_dependencies(envelope_pos, spec, pattern):
+            memo.dependents.setdefault(brick, set()).add(envelope_pos)
+    return n_layed_bricks
+
+
+# How many courses from the bottommost unlayed brick up find_best_next_envelope_pos tries
+DEFAULT_CANDIDATE_COURSES = 3
+
+
+def get_course_edges(
+    y: int, config: WallSpec | dict, pattern: list[list[str]]
+) -> tuple[list[int], list[int]]:
+    """
+    Returns the lists of the left edges and the right edges of the bricks in the course
+    Both lists are sorted, so they can be searched with bisect
+    """
+    spec = as_spec(config)
+    lengths = spec.lengths
+    type_codes = spec.type_codes
+    lefts = []
+    rights = []
+    x = 0
+    for brick_type in pattern[y]:
+        lefts.append(x)
+        x += lengths[type_codes[brick_type]]
+        rights.append(x)
+        x += spec.head_joint
+    return lefts, rights
+
+
+def count_bricks_in_envelope(
+    envelope_pos: Point,
+    remaining_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    edges: dict[int, tuple[list[int], list[int]]],
+) -> int:
+    """
+    Upper bound for the number of bricks lay_bricks lays from the envelope position
+    can_lay only lays the unlayed bricks that are completely within the envelope and have
+    all the bricks right beneath them layed, so I count such bricks course by course from the bottom,
+    taking the bricks counted in the course beneath as layed. It needs no lay_bricks simulation,
+    only a bisect per brick. edges caches get_course_edges of the courses
+    """
+    spec = as_spec(config)
+    envelope_right = envelope_pos.x + spec.envelope_width
+    envelope_top = envelope_pos.y + spec.envelope_height
+    first_course = -(-envelope_pos.y // spec.course_height)
+    n_bricks = 0
+    counted_beneath: set[int] = set()
+    for y in range(first_course, len(pattern)):
+        if y * spec.course_height + spec.brick_height > envelope_top:
+            break
+        if y not in edges:
+            edges[y] = get_course_edges(y, spec, pattern)
+        lefts, rights = edges[y]
+        if y > 0 and y - 1 not in edges:
+            edges[y - 1] = get_course_edges(y - 1, spec, pattern)
+        lefts_beneath, rights_beneath = edges[y - 1] if y > 0 else ([], [])
+        counted = set()
+        for x in range(
+            bisect.bisect_left(lefts, envelope_pos.x),
+            bisect.bisect_right(rights, envelope_right),
+        ):
+            if PositionInPattern(x, y) not in remaining_bricks:
+                continue
+            # the bricks beneath are the ones overlapping the brick as in get_bricks_beneath
+            first_beneath = bisect.bisect_left(rights_beneath, lefts[x])
+            last_beneath = bisect.bisect_right(lefts_beneath, rights[x])
+            if all(
+                other_x in counted_beneath
+                or PositionInPattern(other_x, y - 1) not in remaining_bricks
+                for other_x in range(first_beneath, last_beneath)
+            ):
+                counted.add(x)
+        n_bricks += len(counted)
+        counted_beneath = counted
+    return n_bricks
+
+
 def find_best_next_envelope_pos(
-    remaining_bricks: set[PositionInPattern], config: dict, pattern: list[list[str]]
+    remaining_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memo: CandidateMemo | None = None,
+    prune: bool = True,
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
 ) -> Point:
+    """
+    Tries the envelope at the x positions of the bricks in the bottom candidate_courses courses
+    with unlayed bricks and returns the position where the most bricks can be layed
+    (the first such position if there are several)
+    The memo keeps the numbers of layed bricks between the strides, see forget_layed_bricks
+    With prune the candidates are tried in the order of count_bricks_in_envelope and the ones
+    whose bound can't beat the best position found are skipped. The result is the same as without prune
+    """
+    spec = as_spec(config)
     bottom_brick_pos = find_leftmost_bottomest_unlayed_brick(remaining_bricks)
-    bottom_brick_coord = brick_bottom_left(bottom_brick_pos, config, pattern)
+    envelope_y = bottom_brick_pos.y * spec.course_height
+    edges: dict[int, tuple[list[int], list[int]]] = {}
+    candidates = []
+    for y in range(
+        bottom_brick_pos.y, min(bottom_brick_pos.y + candidate_courses, len(pattern))
+    ):
+        edges[y] = get_course_edges(y, spec, pattern)
+        candidates.extend(Point(left, envelope_y) for left in edges[y][0])
+
     best_n_layed_bricks = 0
-    best_envelope_pos = Point(0, 0)
-    for i in range(min(3, len(pattern) - bottom_brick_pos.y)):
-        for x_pos in range(len(pattern[bottom_brick_pos.y + i])):
-            brick_pos = PositionInPattern(x_pos, bottom_brick_pos.y + i)
-            brick_coord = brick_bottom_left(brick_pos, config, pattern)
-            envelope_pos = Point(brick_coord.x, bottom_brick_coord.y)
-            layed_bricks = lay_bricks(envelope_pos, remaining_bricks, config, pattern)
-            if len(layed_bricks) > best_n_layed_bricks:
-                best_n_layed_bricks = len(layed_bricks)
-                best_envelope_pos = envelope_pos
-    return best_envelope_pos
-
-
-def get_instructions(config: dict, pattern: list[list[str]]) -> list[Stride]:
-    remaining_bricks = generate_positions_in_pattern_for_all_bricks(pattern)
-    instructions: list[Stride] = []
+    best_candidate = None
+    if prune:
+        bounds = [
+            count_bricks_in_envelope(
+                envelope_pos, remaining_bricks, spec, pattern, edges
+            )
+            for envelope_pos in candidates
+        ]
+        order = sorted(range(len(candidates)), key=lambda i: (-bounds[i], i))
+    else:
+        order = range(len(candidates))
+    for i in order:
+        if prune:
+            if bounds[i] < best_n_layed_bricks:
+                break
+            # an equal result wins only if it comes earlier, as in the plain loop
+            if bounds[i] == best_n_layed_bricks and (
+                best_candidate is None or i > best_candidate
+            ):
+                continue
+        n_layed_bricks = count_layed_bricks(
+            candidates[i], remaining_bricks, spec, pattern, memo
+        )
+        if n_layed_bricks > best_n_layed_bricks or (
+            n_layed_bricks == best_n_layed_bricks
+            and best_candidate is not None
+            and i < best_candidate
+        ):
+            best_n_layed_bricks = n_layed_bricks
+            best_candidate = i
+    if best_candidate is None:
+        return Point(0, 0)
+    return candidates[best_candidate]
+
+
+def continue_instructions(
+    instructions: list[Stride],
+    remaining_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memoize: bool = True,
+    prune: bool = True,
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
+) -> list[Stride]:
+    """
+    Plans the strides for the remaining bricks after the already planned instructions
+    The passed remaining_bricks set is emptied in the process
+    """
+    return instructions + list(
+        iter_strides(
+            remaining_bricks, config, pattern, memoize, prune, candidate_courses
+        )
+    )
+
+
+def iter_strides(
+    remaining_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memoize: bool = True,
+    prune: bool = True,
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
+):
+    """
+    Plans the strides for the remaining bricks and yields every stride as soon as it is planned
+    The passed remaining_bricks set is emptied in the process
+    With memoize the envelope positions tried for one stride aren't simulated again for the next
+    strides unless the layed bricks affect them. The plan is the same as without memoize
+    prune and candidate_courses are passed to find_best_next_envelope_pos
+    """
+    spec = as_spec(config)
+    memo = CandidateMemo({}, {}) if memoize else None
     while len(remaining_bricks) > 0:
-        envelope_pos = find_best_next_envelope_pos(remaining_bricks, config, pattern)
-        layed_bricks = lay_bricks(envelope_pos, remaining_bricks, config, pattern)
-        instructions.append(Stride(envelope_pos, layed_bricks))
+        envelope_pos = find_best_next_envelope_pos(
+            remaining_bricks, spec, pattern, memo, prune, candidate_courses
+        )
+        layed_bricks = lay_bricks(envelope_pos, remaining_bricks, spec, pattern)
         remaining_bricks.difference_update(layed_bricks)
-    return instructions
+        if memo is not None:
+            forget_layed_bricks(memo, layed_bricks)
+        yield Stride(envelope_pos, layed_bricks)
+
+
+def iter_instructions(
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memoize: bool = True,
+    prune: bool = True,
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
+):
+    remaining_bricks = generate_positions_in_pattern_for_all_bricks(pattern)
+    yield from iter_strides(
+        remaining_bricks, config, pattern, memoize, prune, candidate_courses
+    )
+
+
+def get_instructions(
+    config: WallSpec | dict,
+    pattern: list[list[str]],
+    memoize: bool = True,
+    prune: bool = True,
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
+) -> list[Stride]:
+    return list(iter_instructions(config, pattern, memoize, prune, candidate_courses))
+
+
+def get_changed_bricks(
+    config: WallSpec | dict, old_pattern: list[list[str]], new_pattern: list[list[str]]
+) -> set[PositionInPattern]:
+    """
+    Returns the positions of the old pattern that don't hold the same brick in the new pattern,
+    i. e. the brick is removed, has another type or has moved because of a change to its left
+    """
+    spec = as_spec(config)
+    changed = set()
+    for y, old_course in enumerate(old_pattern):
+        new_course = new_pattern[y] if y < len(new_pattern) else []
+        for x, old_type in enumerate(old_course):
+            # All the bricks after the first changed brick of the course move unless
+            # the lengths of the changed bricks add up to the same length, so I compare the positions
+            pos = PositionInPattern(x, y)
+            if (
+                x >= len(new_course)
+                or new_course[x] != old_type
+                or brick_bottom_left(pos, spec, new_pattern)
+                != brick_bottom_left(pos, spec, old_pattern)
+            ):
+                changed.add(pos)
+    return changed
+
+
+def find_first_affected_stride(
+    instructions: list[Stride],
+    changed_bricks: set[PositionInPattern],
+    config: WallSpec | dict,
+    old_pattern: list[list[str]],
+    new_pattern: list[list[str]],
+) -> int:
+    """
+    Returns the number of the first stride that lays a changed brick or a brick
+    whose support (the bricks right beneath it in either pattern) has changed
+    """
+    spec = as_spec(config)
+    # the courses right above the changed bricks are the only ones whose support could change
+    changed_support_courses = {brick.y + 1 for brick in changed_bricks}
+    # new bricks added at the end of a longer course change the support too
+    for y, new_course in enumerate(new_pattern):
+        if y >= len(old_pattern) or len(new_course) > len(old_pattern[y]):
+            changed_support_courses.add(y + 1)
+    for stride_n, stride in enumerate(instructions):
+        for brick in stride.steps:
+            if brick in changed_bricks:
+                return stride_n
+            if brick.y not in changed_support_courses:
+                continue
+            new_beneath = get_bricks_beneath(brick, spec, new_pattern)
+            old_beneath = get_bricks_beneath(brick, spec, old_pattern)
+            if new_beneath != old_beneath or new_beneath & changed_bricks:
+                return stride_n
+    return len(instructions)
+
+
+def replan_instructions(
+    config: WallSpec | dict,
+    old_pattern: list[list[str]],
+    old_instructions: list[Stride],
+    new_pattern: list[list[str]],
+    candidate_courses: int = DEFAULT_CANDIDATE_COURSES,
+) -> list[Stride]:
+    """
+    Incremental version of get_instructions for a locally edited pattern
+    The strides before the first stride affected by the edit are reused unchanged,
+    the rest of the wall is planned again from there
+    The result is a valid plan, but it isn't guaranteed to be the same as get_instructions would return
+    """
+    spec = as_spec(config)
+    changed_bricks = get_changed_bricks(spec, old_pattern, new_pattern)
+    first_affected = find_first_affected_stride(
+        old_instructions, changed_bricks, spec, old_pattern, new_pattern
+    )
+    kept_instructions = old_instructions[:first_affected]
+    remaining_bricks = generate_positions_in_pattern_for_all_bricks(new_pattern)
+    for stride in kept_instructions:
+        remaining_bricks.difference_update(stride.steps)
+    return continue_instructions(
+        kept_instructions,
+        remaining_bricks,
+        spec,
+        new_pattern,
+        candidate_courses=candidate_courses,
+    )
 
 
-def print_instructions(instructions: list[Stride]):
+def print_instructions(instructions: list[Stride], config: WallSpec | dict):
+    spec = as_spec(config)
+    # the envelope positions are written in mm, so the files don't depend on the units
     for stride in instructions:
-        print(f"move {stride.envelope_pos.x} {stride.envelope_pos.y}")
+        x = spec.to_mm(stride.envelope_pos.x)
+        y = spec.to_mm(stride.envelope_pos.y)
+        print(f"move {x} {y}")
         for step in stride.steps:
             print(f"lay {step.x} {step.y}")
 
 
-def load_from_file(file) -> list[Stride]:
+def load_from_file(file, config: WallSpec | dict) -> list[Stride]:
+    spec = as_spec(config)
     instructions: list[Stride] = []
-    for line in file.readlines():
-        cmd, x, y = line.split()
+    for line_n, line in enumerate(file.readlines()):
+        words = line.split()
+        if len(words) != 3:
+            raise ValueError(
+                f"line {line_n + 1} of the steps should be 'move x y' or 'lay x y'"
+            )
+        cmd, x, y = words
         if cmd == "move":
-            instructions.append(Stride(Point(float(x), float(y)), []))
+            envelope_pos = Point(spec.from_mm(float(x)), spec.from_mm(float(y)))
+            instructions.append(Stride(envelope_pos, []))
         elif cmd == "lay":
+            if not instructions:
+                raise ValueError(
+                    f"line {line_n + 1} of the steps lays a brick before the first move"
+                )
             instructions[-1].steps.append(PositionInPattern(int(x), int(y)))
         else:
             pass
@@ -0,0 +1,118 @@
+import copy
+import itertools
+import multiprocessing
+import time
+
+from . import pattern, steps
+from .wallspec import WallSpecError, compile_config
+
+
+def parse_value(s: str) -> int | float:
+    value = float(s)
+    if value.is_integer() and "." not in s:
+        return int(value)
+    return value
+
+
+def parse_range(arg: str) -> tuple[str, list[int | float]]:
+    """
+    Parses a sweep range given on the command line
+    The format is either "key=start:stop:step" (stop is included) or "key=v1,v2,v3"
+    The key is a dotted path into the wallconfig, e.g. "envelope.width" or "joints.head"
+    """
+    if "=" not in arg:
+        raise ValueError(
+            f"sweep range {arg} should look like key=start:stop:step or key=v1,v2"
+        )
+    key, values = arg.split("=", 1)
+    try:
+        numbers = [parse_value(v) for v in values.replace(":", ",").split(",")]
+    except ValueError:
+        raise ValueError(
+            f"sweep range {arg} should have only numbers after ="
+        ) from None
+    if ":" in values:
+        if len(numbers) != 3:
+            raise ValueError(f"sweep range {arg} should look like key=start:stop:step")
+        start, stop, step = numbers
+        if step <= 0:
+            raise ValueError(f"sweep range {arg} has non-positive step {step}")
+        # I count the steps instead of adding up the floats to not lose the last value to rounding
+        # and round the values so 0.1 steps don't turn into 12.600000000000001 mm
+        n = int(round((stop - start) / step))
+        return key, [round(start + i * step, 9) for i in range(n + 1)]
+    return key, numbers
+
+
+def set_by_path(config: dict, key: str, value: int | float):
+    *path, last = key.split(".")
+    section = config
+    for name in path:
+        section = section[name]
+    if last not in section:
+        raise KeyError(last)
+    section[last] = value
+
+
+def expand_configs(
+    base_config: dict, ranges: list[tuple[str, list[int | float]]]
+) -> list[tuple[dict, dict]]:
+    """
+    Returns the pairs (swept parameters, wallconfig) for every combination of the ranges
+    """
+    for key, _ in ranges:
+        try:
+            set_by_path(copy.deepcopy(base_config), key, 0)
+        except (KeyError, TypeError):
+            raise ValueError(f"sweep key {key} isn't present in the base wallconfig")
+    configs = []
+    keys = [key for key, _ in ranges]
+    for values in itertools.product(*(values for _, values in ranges)):
+        params = dict(zip(keys, values))
+        config = copy.deepcopy(base_config)
+        for key, value in params.items():
+            set_by_path(config, key, value)
+        configs.append((params, config))
+    return configs
+
+
+def run_one(params_and_config: tuple[dict, dict]) -> dict:
+    params, config = params_and_config
+    record = {"params": params, "bond": config.get("bond", None)}
+    # Only the wallconfigs the generators reject are recorded, other errors are bugs
+    try:
+        spec = compile_config(config)
+        start = time.perf_counter()
+        ptrn = pattern.get_pattern(spec)
+        record["pattern_time"] = time.perf_counter() - start
+    except (WallSpecError, pattern.PatternError) as e:
+        record["error"] = str(e)
+        return record
+    start = time.perf_counter()
+    instructions = steps.get_instructions(spec, ptrn)
+    record["steps_time"] = time.perf_counter() - start
+    record["n_bricks"] = pattern.get_total_n_bricks(ptrn)
+    record["n_strides"] = len(instructions)
+    return record
+
+
+def run_configs(configs: list[tuple[dict, dict]], processes: int | None = None):
+    """
+    Generates the pattern and the steps for every (swept parameters, wallconfig) pair
+    of expand_configs in a process pool, yields one record per pair in their order
+    """
+    # Every wild bond pattern gets its own random.Random(), so the forked workers don't repeat the walls
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(run_one, configs)
+
+
+def run_sweep(
+    base_config: dict,
+    ranges: list[tuple[str, list[int | float]]],
+    processes: int | None = None,
+):
+    """
+    Generates the pattern and the steps for every combination of the ranges in a process pool
+    Yields one record per combination in the order of the combinations
+    """
+    yield from run_configs(expand_configs(base_config, ranges), processes)
@@ -0,0 +1,89 @@
+import bisect
+
+from typing import NamedTuple
+
+from .steps import PositionInPattern, Stride, get_course_edges
+from .wallspec import WallSpec, as_spec
+
+
+class PlanViolation(NamedTuple):
+    # number of the stride in the plan, None if the violation isn't in a particular stride
+    stride_n: int | None
+    brick: PositionInPattern
+    message: str
+
+
+def validate_plan(
+    instructions: list[Stride], config: WallSpec | dict, pattern: list[list[str]]
+) -> PlanViolation | None:
+    """
+    Checks that the plan lays every brick of the pattern exactly once, every brick after
+    the bricks right beneath it and completely within the envelope of its stride
+    (the same rules as steps.can_lay). Returns the first violation or None if the plan is valid
+    A brick of the pattern with a type the config doesn't know is a violation too
+    The edges of the courses are computed once and the bricks beneath are found with bisect,
+    so it takes O(n log n) for n bricks
+    """
+    spec = as_spec(config)
+    # the geometry of the courses needs the sizes of all the brick types
+    for y, course in enumerate(pattern):
+        for x, brick_type in enumerate(course):
+            if brick_type not in spec.type_codes:
+                return PlanViolation(
+                    None,
+                    PositionInPattern(x, y),
+                    f"unknown brick type {brick_type} in the pattern",
+                )
+    edges = [get_course_edges(y, spec, pattern) for y in range(len(pattern))]
+    layed: set[PositionInPattern] = set()
+    for stride_n, stride in enumerate(instructions):
+        envelope_left, envelope_bottom = stride.envelope_pos
+        envelope_right = envelope_left + spec.envelope_width
+        envelope_top = envelope_bottom + spec.envelope_height
+        for brick in stride.steps:
+            if not (
+                0 <= brick.y < len(pattern) and 0 <= brick.x < len(pattern[brick.y])
+            ):
+                return PlanViolation(stride_n, brick, "the brick isn't in the pattern")
+            if brick in layed:
+                return PlanViolation(stride_n, brick, "the brick is already layed")
+            lefts, rights = edges[brick.y]
+            bottom = brick.y * spec.course_height
+            top = bottom + spec.height(pattern[brick.y][brick.x])
+            if (
+                lefts[brick.x] < envelope_left
+                or bottom < envelope_bottom
+                or rights[brick.x] > envelope_right
+                or top > envelope_top
+            ):
+                return PlanViolation(
+                    stride_n, brick, "the brick isn't within the envelope"
+                )
+            if brick.y > 0:
+                # the bricks beneath are the ones overlapping the brick as in steps.get_bricks_beneath
+                lefts_beneath, rights_beneath = edges[brick.y - 1]
+                first = bisect.bisect_left(rights_beneath, lefts[brick.x])
+                last = bisect.bisect_right(lefts_beneath, rights[brick.x])
+                for x in range(first, last):
+                    if PositionInPattern(x, brick.y - 1) not in layed:
+                        return PlanViolation(
+                            stride_n,
+                            brick,
+                            f"brick {x} {brick.y - 1} beneath isn't layed yet",
+                        )
+            layed.add(brick)
+    if len(layed) < sum(map(len, pattern)):
+        for y, course in enumerate(pattern):
+            for x in range(len(course)):
+                if PositionInPattern(x, y) not in layed:
+                    return PlanViolation(
+                        None, PositionInPattern(x, y), "the brick is never layed"
+                    )
+    return None
+
+
+def describe(violation: PlanViolation) -> str:
+    brick = f"brick {violation.brick.x} {violation.brick.y}"
+    if violation.stride_n is None:
+        return f"{brick}: {violation.message}"
+    return f"stride {violation.stride_n + 1} {brick}: {violation.message}"
@@ -3,7 +3,8 @@ import sys
 import pygame
 
 from .pattern import get_total_n_bricks
-from .steps import Stride, brick_bottom_left
+from .steps import Point, Stride, brick_bottom_left
+from .wallspec import WallSpec, as_spec
 
 
 # There is no direct hsla color constructor in pygame, so I made a function for it
@@ -23,19 +24,23 @@ def get_current_stride_n(n_layed_bricks: int, instructions: list[Stride]) -> int
 
 
 def create_wall(
-    config: dict,
+    config: WallSpec | dict,
     ptrn: list[list[str]],
     instructions: list[Stride],
     n_layed_bricks: int,
 ) -> pygame.Surface:
+    spec = as_spec(config)
+
     # initialize font for rendering stride numbers
 
     DEFAULT_FONT = pygame.font.SysFont(pygame.font.get_default_font(), 50)
 
     # Create the Surface for the wall, fill it with white
 
-    wall_width = config["wall"]["width"]
-    wall_height = config["wall"]["height"]
+    # The wall is drawn in mm, while the geometry of the spec is in integer units
+    mm = spec.to_mm
+    wall_width = mm(spec.wall_width)
+    wall_height = mm(spec.wall_height)
 
     wall = pygame.Surface((wall_width, wall_height))
     wall.fill("white")
@@ -43,10 +48,10 @@ def create_wall(
     # Draw the envelope
 
     current_stride_n = get_current_stride_n(n_layed_bricks, instructions)
-    envelope_left_x = instructions[current_stride_n].envelope_pos.x
-    envelope_bottom_y = instructions[current_stride_n].envelope_pos.y
-    envelope_width = config["envelope"]["width"]
-    envelope_height = config["envelope"]["height"]
+    envelope_left_x = mm(instructions[current_stride_n].envelope_pos.x)
+    envelope_bottom_y = mm(instructions[current_stride_n].envelope_pos.y)
+    envelope_width = mm(spec.envelope_width)
+    envelope_height = mm(spec.envelope_height)
 
     # In my coordinate system (0, 0) is at the bottom left of the wall
     # x goes right, y goes up
@@ -72,10 +77,11 @@ def create_wall(
     brick_n = 0
     for stride_n, stride in enumerate(instructions):
         for brick_pos in stride.steps:
-            brick_bottom_left_coords = brick_bottom_left(brick_pos, config, ptrn)
+            bottom_left = brick_bottom_left(brick_pos, spec, ptrn)
+            brick_bottom_left_coords = Point(mm(bottom_left.x), mm(bottom_left.y))
             brick_type = ptrn[brick_pos.y][brick_pos.x]
-            brick_length = config["bricks"][brick_type]["length"]
-            brick_height = config["bricks"][brick_type]["height"]
+            brick_length = mm(spec.length(brick_type))
+            brick_height = mm(spec.height(brick_type))
             # layed bricks have lightness 30 (dark), unlayed bricks have lightnes 80 (light)
             brick_color = (
                 hsl_color(0, 0, 30) if brick_n < n_layed_bricks else hsl_color(0, 0, 80)
@@ -110,7 +116,11 @@ def create_wall(
     return wall
 
 
-def vizualize(config: dict, ptrn: list[list[str]], instructions: list[Stride]):
+def vizualize(
+    config: WallSpec | dict, ptrn: list[list[str]], instructions: list[Stride]
+):
+
+    spec = as_spec(config)
 
     # variables for window size and padding
 
@@ -165,7 +175,7 @@ def vizualize(config: dict, ptrn: list[list[str]], instructions: list[Stride]):
 
         # Actually creating the visualization of the wall
 
-        wall = create_wall(config, ptrn, instructions, n_layed_bricks)
+        wall = create_wall(spec, ptrn, instructions, n_layed_bricks)
 
         # Put the visualization on screen taking the window resizing into account
 
@@ -0,0 +1,185 @@
+import functools
+import math
+
+from fractions import Fraction
+from types import MappingProxyType
+
+
+# The brick types each bond generator relies on
+BOND_BRICK_TYPES = {
+    "stretcher": ("f", "h"),
+    "english cross": ("f", "h", "q"),
+    "flemish": ("f", "h", "q"),
+    "wild": ("f", "h", "d", "q"),
+}
+
+
+class WallSpecError(ValueError):
+    pass
+
+
+class WallSpec:
+    """
+    Validated and flattened wallconfig
+    All the lengths are integers in units of 1 / units_per_mm mm, so the geometry is exact
+    Brick types get integer codes in the order they appear in the config,
+    lengths and heights are tuples indexed by these codes
+    """
+
+    __slots__ = (
+        "bond",
+        "units_per_mm",
+        "envelope_width",
+        "envelope_height",
+        "wall_width",
+        "wall_height",
+        "head_joint",
+        "bed_joint",
+        "brick_height",
+        "course_height",
+        "type_names",
+        "type_codes",
+        "lengths",
+        "heights",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+        object.__setattr__(
+            self, "type_codes", MappingProxyType(dict(fields["type_codes"]))
+        )
+
+    def __reduce__(self):
+        # copy, deepcopy and pickle rebuild the spec through __init__,
+        # the mappingproxy itself can't be pickled, so it goes as a plain dict
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields["type_codes"] = dict(self.type_codes)
+        return (functools.partial(WallSpec, **fields), ())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WallSpec is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("WallSpec is immutable")
+
+    def __repr__(self):
+        wall = f"{self.to_mm(self.wall_width)}x{self.to_mm(self.wall_height)}"
+        envelope = (
+            f"{self.to_mm(self.envelope_width)}x{self.to_mm(self.envelope_height)}"
+        )
+        return f"WallSpec(bond={self.bond!r}, wall={wall}, envelope={envelope})"
+
+    def to_mm(self, units: int) -> int | float:
+        mm = Fraction(units, self.units_per_mm)
+        return int(mm) if mm.denominator == 1 else float(mm)
+
+    def from_mm(self, mm: int | float) -> int:
+        units = to_fraction(mm) * self.units_per_mm
+        if units.denominator != 1:
+            raise WallSpecError(
+                f"{mm} mm isn't a whole number of 1/{self.units_per_mm} mm units"
+            )
+        return int(units)
+
+    def length(self, brick_type: str) -> int:
+        return self.lengths[self.type_codes[brick_type]]
+
+    def height(self, brick_type: str) -> int:
+        return self.heights[self.type_codes[brick_type]]
+
+
+def get_section(config: dict, name: str) -> dict:
+    section = config.get(name, None)
+    if not isinstance(section, dict):
+        raise WallSpecError(f"wallconfig has no [{name}] section")
+    return section
+
+
+def get_number(section: dict, path: str, key: str, allow_zero: bool = False) -> float:
+    value = section.get(key, None)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise WallSpecError(f"{path}.{key} should be a number, got {value!r}")
+    if value < 0 or (value == 0 and not allow_zero):
+        raise WallSpecError(f"{path}.{key} should be positive, got {value}")
+    return value
+
+
+def to_fraction(value: int | float) -> Fraction:
+    # Going through the shortest repr makes 0.1 exactly 1/10 and not the closest binary float
+    return Fraction(repr(value)) if isinstance(value, float) else Fraction(value)
+
+
+def compile_config(config: dict) -> WallSpec:
+    """
+    Validates the wallconfig loaded from TOML and compiles it into a WallSpec
+    Raises WallSpecError describing the first problem found
+    """
+    bond = config.get("bond", None)
+    if bond not in BOND_BRICK_TYPES:
+        raise WallSpecError(f"bond {bond} unsupported")
+    envelope = get_section(config, "envelope")
+    wall = get_section(config, "wall")
+    joints = get_section(config, "joints")
+    bricks = get_section(config, "bricks")
+
+    for brick_type in BOND_BRICK_TYPES[bond]:
+        if brick_type not in bricks:
+            raise WallSpecError(
+                f"{bond} bond needs brick type {brick_type} in [bricks]"
+            )
+    type_names = tuple(bricks.keys())
+    lengths = []
+    heights = []
+    for brick_type in type_names:
+        brick = bricks[brick_type]
+        if not isinstance(brick, dict):
+            raise WallSpecError(f"bricks.{brick_type} should be a section")
+        lengths.append(get_number(brick, f"bricks.{brick_type}", "length"))
+        heights.append(get_number(brick, f"bricks.{brick_type}", "height"))
+    # The generators lay the bricks in courses, so all the bricks must have the same height
+    if len(set(heights)) > 1:
+        raise WallSpecError(
+            "all bricks should have the same height, "
+            f"got {dict(zip(type_names, heights))}"
+        )
+
+    mm = {
+        "envelope_width": get_number(envelope, "envelope", "width"),
+        "envelope_height": get_number(envelope, "envelope", "height"),
+        "wall_width": get_number(wall, "wall", "width"),
+        "wall_height": get_number(wall, "wall", "height"),
+        "head_joint": get_number(joints, "joints", "head", allow_zero=True),
+        "bed_joint": get_number(joints, "joints", "bed", allow_zero=True),
+    }
+
+    # The unit is the least common denominator of all the lengths in the config,
+    # e. g. 1/2 mm for the 12.5 mm bed joint
+    fractions = [to_fraction(v) for v in [*mm.values(), *lengths, *heights]]
+    units_per_mm = math.lcm(*(f.denominator for f in fractions))
+
+    def to_units(value):
+        return int(to_fraction(value) * units_per_mm)
+
+    units = {key: to_units(value) for key, value in mm.items()}
+    brick_height = to_units(heights[0])
+    return WallSpec(
+        bond=bond,
+        units_per_mm=units_per_mm,
+        **units,
+        brick_height=brick_height,
+        course_height=brick_height + units["bed_joint"],
+        type_names=type_names,
+        type_codes={brick_type: code for code, brick_type in enumerate(type_names)},
+        lengths=tuple(to_units(length) for length in lengths),
+        heights=tuple(to_units(height) for height in heights),
+    )
+
+
+def as_spec(config: "WallSpec | dict") -> WallSpec:
+    """
+    Lets the functions accept both a compiled WallSpec and a raw wallconfig dict
+    """
+    if isinstance(config, WallSpec):
+        return config
+    return compile_config(config)
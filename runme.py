@@ -1,8 +1,10 @@
 import argparse
+import json
 import sys
 import tomllib
 
 from lib import pattern, steps
+from lib.wallspec import WallSpec, WallSpecError, compile_config
 
 
 def get_config(filename: str) -> dict:
@@ -11,24 +13,57 @@ def get_config(filename: str) -> dict:
     return tomllib.load(file)
 
 
-def get_pattern(filename: str | None, config: dict) -> list[list[str]]:
+def get_wallspec(filename: str) -> WallSpec:
+    config = get_config(filename)
+    try:
+        return compile_config(config)
+    except WallSpecError as e:
+        print(f"Error: invalid wallconfig {filename}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def get_machine_profile(filename: str):
+    from lib import simulate
+
+    print(f"Loading machineconfig from {filename}", file=sys.stderr)
+    file = open(filename, "rb")
+    try:
+        return simulate.load_profile(file)
+    except simulate.MachineProfileError as e:
+        print(f"Error: invalid machineconfig {filename}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def get_pattern(filename: str | None, config: WallSpec) -> list[list[str]]:
     if filename:
         print(f"Loading brickpattern from {filename}", file=sys.stderr)
         file = open(filename, "r")
         return pattern.load_from_file(file)
     print(f"Generating brickpattern...", file=sys.stderr)
-    return pattern.get_pattern(config)
+    try:
+        return pattern.get_pattern(config)
+    except pattern.PatternError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
 
 def get_instructions(
-    filename: str | None, config: dict, ptrn: list[list[str]]
+    filename: str | None,
+    config: WallSpec,
+    ptrn: list[list[str]],
+    candidate_courses: int = steps.DEFAULT_CANDIDATE_COURSES,
 ) -> list[steps.Stride]:
     if filename:
         print(f"Loading bricksteps from {filename}", file=sys.stderr)
         file = open(filename, "r")
-        return steps.load_from_file(file)
+        try:
+            return steps.load_from_file(file, config)
+        except ValueError as e:
+            # WallSpecError too: a move to a position that isn't a whole number of units
+            print(f"Error: invalid bricksteps {filename}: {e}", file=sys.stderr)
+            sys.exit(1)
     print(f"Generating steps (can take a few seconds)...", file=sys.stderr)
-    return steps.get_instructions(config, ptrn)
+    return steps.get_instructions(config, ptrn, candidate_courses=candidate_courses)
 
 
 if __name__ == "__main__":
@@ -49,27 +84,249 @@ if __name__ == "__main__":
         "--bricksteps",
         help="Pregenerated laying steps, useful when you don't want to wait for the generation again",
     )
+    parser.add_argument(
+        "--editedbrickpattern",
+        help="Locally edited version of --brickpattern for the replan mode",
+    )
     parser.add_argument(
         "--mode",
-        choices=["visualize", "pattern", "steps"],
+        choices=[
+            "visualize",
+            "pattern",
+            "steps",
+            "sweep",
+            "replan",
+            "schedule",
+            "simulate",
+            "order",
+            "fuzz",
+            "send",
+            "validate",
+        ],
         default="visualize",
         help="You may run only the pattern generation or only the steps generation instead of default visualize mode",
     )
+    parser.add_argument(
+        "--sweep",
+        action="append",
+        default=[],
+        help="Parameter range for the sweep mode as key=start:stop:step or key=v1,v2, e.g. envelope.width=600:1000:100",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Number of worker processes for the sweep mode, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--machineconfig",
+        help="Machine profile for the simulate and schedule modes, see default.machineconfig",
+        default="default.machineconfig",
+    )
+    parser.add_argument(
+        "--machines",
+        type=int,
+        default=2,
+        help="Maximum number of machines working on the wall at the same time for the schedule mode",
+    )
+    parser.add_argument(
+        "--cases",
+        type=int,
+        default=20,
+        help="Number of random wallconfigs for the fuzz mode",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for the fuzz mode",
+    )
+    parser.add_argument(
+        "--candidatecourses",
+        type=int,
+        default=steps.DEFAULT_CANDIDATE_COURSES,
+        help="Number of courses above the lowest unlayed brick where the steps generation tries the envelope",
+    )
+    parser.add_argument(
+        "--controller",
+        help="Address of the robot controller for the send mode, tcp://host:port or unix:/path",
+    )
     args = parser.parse_args()
 
     if args.mode == "pattern":
-        config = get_config(args.wallconfig)
-        ptrn = get_pattern(args.brickpattern, config)
-        pattern.print_pattern(ptrn)
+        config = get_wallspec(args.wallconfig)
+        if args.brickpattern:
+            pattern.print_pattern(get_pattern(args.brickpattern, config))
+        else:
+            # The courses are printed as soon as they are generated, so the output starts right away
+            print(f"Generating brickpattern...", file=sys.stderr)
+            try:
+                for course in pattern.iter_pattern(config):
+                    print(" ".join(course), flush=True)
+            except pattern.PatternError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
     elif args.mode == "steps":
-        config = get_config(args.wallconfig)
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
+        steps.print_instructions(instructions, config)
+    elif args.mode == "replan":
+        if not (args.brickpattern and args.bricksteps and args.editedbrickpattern):
+            parser.error(
+                "replan mode needs --brickpattern, --bricksteps and --editedbrickpattern"
+            )
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
+        edited_ptrn = get_pattern(args.editedbrickpattern, config)
+        print(f"Replanning steps for the edited brickpattern...", file=sys.stderr)
+        instructions = steps.replan_instructions(
+            config, ptrn, instructions, edited_ptrn, args.candidatecourses
+        )
+        steps.print_instructions(instructions, config)
+    elif args.mode == "schedule":
+        from lib import schedule
+
+        if args.machines < 1:
+            parser.error(f"--machines should be at least 1, got {args.machines}")
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
+        profile = get_machine_profile(args.machineconfig)
+        print(f"Scheduling strides for {args.machines} machines...", file=sys.stderr)
+        schedule.print_schedule(
+            schedule.schedule_strides(
+                instructions, config, ptrn, args.machines, profile
+            )
+        )
+    elif args.mode == "simulate":
+        from lib import simulate
+
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
+        profile = get_machine_profile(args.machineconfig)
+        simulate.print_simulation(
+            simulate.simulate(instructions, config, ptrn, profile)
+        )
+    elif args.mode == "order":
+        from lib import ordering, simulate
+
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
+        profile = get_machine_profile(args.machineconfig)
+        print(f"Reordering bricks within the strides...", file=sys.stderr)
+        try:
+            instructions, savings = ordering.order_instructions(
+                instructions, config, ptrn, profile
+            )
+        except simulate.MachineProfileError as e:
+            print(
+                f"Error: invalid machineconfig {args.machineconfig}: {e}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        # The steps go to stdout, so they can be saved and used as --bricksteps
+        ordering.print_savings(savings, file=sys.stderr)
+        steps.print_instructions(instructions, config)
+    elif args.mode == "fuzz":
+        from lib import harness
+
+        n_failed = 0
+        for record in harness.run_harness(args.cases, args.seed):
+            print(json.dumps(record), flush=True)
+            if not record["ok"]:
+                n_failed += 1
+                print(
+                    f"Case {record['case']} (seed {record['seed']}) "
+                    f"failed {record['check']}: {record['error']}",
+                    file=sys.stderr,
+                )
+        print(f"{n_failed} checks failed", file=sys.stderr)
+        sys.exit(1 if n_failed else 0)
+    elif args.mode == "validate":
+        from lib import validate
+
+        # A generated pattern wouldn't be the one the steps were made for (the wild bond is random)
+        if not (args.brickpattern and args.bricksteps):
+            parser.error("validate mode needs --brickpattern and --bricksteps")
+        config = get_wallspec(args.wallconfig)
         ptrn = get_pattern(args.brickpattern, config)
         instructions = get_instructions(args.bricksteps, config, ptrn)
-        steps.print_instructions(instructions)
-    elif args.mode == "visualize":
+        violation = validate.validate_plan(instructions, config, ptrn)
+        if violation is not None:
+            print(
+                f"Error: invalid bricksteps {args.bricksteps}: "
+                f"{validate.describe(violation)}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        print(
+            f"Steps are valid: {pattern.get_total_n_bricks(ptrn)} bricks "
+            f"in {len(instructions)} strides",
+            file=sys.stderr,
+        )
+    elif args.mode == "send":
+        import asyncio
+
+        from lib import controller
+
+        if not args.controller:
+            parser.error("send mode needs --controller")
+        try:
+            controller.parse_address(args.controller)
+        except ValueError as e:
+            parser.error(str(e))
+        config = get_wallspec(args.wallconfig)
+        ptrn = get_pattern(args.brickpattern, config)
+        if args.bricksteps:
+            strides = get_instructions(
+                args.bricksteps, config, ptrn, args.candidatecourses
+            )
+        else:
+            # The strides are sent while the next ones are planned
+            print(f"Generating and sending steps...", file=sys.stderr)
+            strides = steps.iter_instructions(
+                config, ptrn, candidate_courses=args.candidatecourses
+            )
+        try:
+            n_commands = asyncio.run(
+                controller.send_plan(args.controller, strides, config)
+            )
+        except (OSError, controller.ControllerError) as e:
+            print(
+                f"Error: can't send the plan to {args.controller}: {e}", file=sys.stderr
+            )
+            sys.exit(1)
+        print(f"Controller acknowledged {n_commands} commands", file=sys.stderr)
+    elif args.mode == "sweep":
+        from lib import sweep
+
         config = get_config(args.wallconfig)
+        try:
+            ranges = [sweep.parse_range(arg) for arg in args.sweep]
+            configs = sweep.expand_configs(config, ranges)
+        except ValueError as e:
+            parser.error(str(e))
+        for record in sweep.run_configs(configs, args.processes):
+            print(json.dumps(record), flush=True)
+    elif args.mode == "visualize":
+        config = get_wallspec(args.wallconfig)
         ptrn = get_pattern(args.brickpattern, config)
-        instructions = get_instructions(args.bricksteps, config, ptrn)
+        instructions = get_instructions(
+            args.bricksteps, config, ptrn, args.candidatecourses
+        )
 
         # I import visualize here because I don't want pygame imported if we aren't in visual mode
         # The problem is that pygame prints a message on import and I don't want this message